@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Conversation, Message, Notification
+from .models import Conversation, ConversationReadState, Message, Notification
 # Register your models here.
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
@@ -26,4 +26,13 @@ class NotificationAdmin(admin.ModelAdmin):
     This class displays Notification in the admin panel.
     """
 
-    list_display = ["id", "message", "user", "is_seen"]
\ No newline at end of file
+    list_display = ["id", "message", "user", "is_seen"]
+
+
+@admin.register(ConversationReadState)
+class ConversationReadStateAdmin(admin.ModelAdmin):
+    """
+    This class displays read watermarks of conversation participants in the admin panel.
+    """
+
+    list_display = ["id", "conversation", "user", "last_seen_message_id"]
\ No newline at end of file
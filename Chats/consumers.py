@@ -1,177 +1,228 @@
 """
 This module defines the ChatConsumer class, which handles WebSocket connections for chat functionality.
-The consumer manages connection, authentication via JWT tokens, message retrieval, and real-time message broadcasting.
+The consumer manages connection, message retrieval, and real-time message broadcasting.
+StreamConsumer carries the chat, unread count and notification streams over one socket.
+Users are authenticated by ``Chats.middleware.JWTAuthMiddleware`` before the consumer runs.
 """
 
 import json
-import jwt
-from urllib.parse import parse_qs
-from django.db.models import Q
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import AnonymousUser
 from django.conf import settings
-from .models import Message, Conversation, Notification
-from .serializers import MessageSerializer
+from django.db import DatabaseError
+from core.pagination import keyset_page
 from Users.models import User
+from . import counters
+from .dispatch import chat_group, unread_group
+from .models import Message, Conversation, ConversationReadState
+from .serializers import MessageSerializer
 
 
-def verify_jwt_token(token):
-    """
-    Verifies the JWT token to authenticate the user.
-
-    Args:
-        token (str): The JWT token.
-
-    Returns:
-        User: The authenticated user, or None if the token is invalid or expired.
-    """
-    try:
-        decoded_payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        decode_access = jwt.decode(
-            decoded_payload["access"], settings.SECRET_KEY, algorithms=["HS256"]
-        )
-        user_id = decode_access["id"]
-        user = User.objects.get(id=user_id)
-        return user
-    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, User.DoesNotExist):
-        return None
-
-
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatMixin:
     """
-    A consumer to handle WebSocket connections for chat functionality.
-
-    Attributes:
-        user (User or AnonymousUser): The user connecting to the WebSocket.
-        conversation_name (str): The name of the conversation room.
-        room_group_name (str): The name of the channel layer group.
+    Database operations on conversations shared by the chat consumers. Expects
+    ``self.user`` to be the authenticated user.
     """
 
-    async def connect(self):
+    def conversation_lookup(self):
         """
-        Handles the connection event when a client attempts to connect to the WebSocket.
-        Verifies the JWT token, adds the user to the channel layer group, and sends the chat history.
+        Returns the conversation lookup for the socket route: by ``conversation_id`` on
+        ``ws/conversation/`` routes, by ``conversation_name`` on the older ones.
         """
-        query_string = self.scope["query_string"].decode()
-        query_params = parse_qs(query_string)
-        token_key = query_params.get("token", [None])[0]
-
-        if token_key:
-            self.user = verify_jwt_token(token_key)
-        else:
-            self.user = AnonymousUser()
-
-        if self.user.is_authenticated:
-            self.conversation_name = self.scope["url_route"]["kwargs"][
-                "conversation_name"
-            ]
-            self.room_group_name = f"chat_{self.conversation_name}"
-
-            await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-            await self.accept()
+        kwargs = self.scope["url_route"]["kwargs"]
+        if "conversation_id" in kwargs:
+            return {"pk": kwargs["conversation_id"]}
+        return {"conversation_name": kwargs["conversation_name"]}
 
-            conversation = await self.get_conversation(self.conversation_name)
-            messages = await self.get_messages(conversation)
-            un_seen_mesasages = await self.get_unseen_messages(conversation, self.user)
-            message_serializer = MessageSerializer(messages, many=True)
-
-            await self.send(text_data=json.dumps(message_serializer.data))
-        else:
-            await self.close()
-
-    async def disconnect(self, close):
-        """
-        Handles the disconnection event when a client disconnects from the WebSocket.
+    @database_sync_to_async
+    def get_member_conversation(self, **lookup):
         """
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        Retrieves a conversation the user takes part in by ``pk`` or
+        ``conversation_name``; both are indexed.
 
-    async def receive(self, text_data):
-        """
-        Handles receiving messages from the WebSocket.
+        Returns:
+            Conversation or None: The conversation, or None if it does not exist or the
+            user is not a participant.
         """
-        try:
-            sender_id = self.user.id
-            message_data = json.loads(text_data)
-            conversation = await self.get_conversation(self.conversation_name)
-            if conversation:
-                new_message = await self.save_message(sender_id, message_data, conversation)
-                message_serializer = MessageSerializer(new_message)
-
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {"type": "chat.message", "message": message_serializer.data},
-                )
-        except Exception as e:
-            print(f"Error in receive method: {str(e)}")
+        return Conversation.objects.filter(participants=self.user, **lookup).first()
 
     @database_sync_to_async
-    def get_conversation(self, room_name):
+    def get_recipients(self, conversation):
         """
-        Retrieves the conversation object based on the room name.
+        Loads the participants of a conversation other than the user.
 
         Returns:
-            Conversation: The conversation object.
+            list or None: The other participants, or None if the user is no longer a
+            participant.
         """
-        return Conversation.objects.get(conversation_name=room_name)
+        participants = list(conversation.participants.only("id", "username"))
+        if not any(participant.id == self.user.id for participant in participants):
+            return None
+        return [participant for participant in participants if participant.id != self.user.id]
 
     @database_sync_to_async
-    def save_message(self, sender_id, message, conversation):
+    def save_message(self, message, conversation, recipients):
         """
-        Saves a new message to the database.
+        Saves a new message and one notification per recipient with ``Message.send``:
+        one insert for the message and one for the notifications.
 
         Returns:
             Message: The saved message object.
         """
-
-        sender = User.objects.get(pk=sender_id)
-        new_message = Message.objects.create(
-            sender=sender, text=message, conversation=conversation
-        )
-        conversation = Conversation.objects.get(conversation_name=conversation)
-        recipients = conversation.participants.exclude(pk=sender.pk)
-        for user in recipients:
-            Notification.objects.create(message=new_message, user=user)
-        return new_message
+        return Message.send(conversation, self.user, message, recipients)
 
     @database_sync_to_async
-    def get_messages(self, conversation):
+    def get_messages(self, conversation, cursor=None):
         """
-        Retrieves all messages for a given conversation, ordered by creation time.
+        Retrieves one page of messages for a given conversation by keyset on
+        ``(created_at, id)``.
 
         Args:
             conversation (Conversation): The conversation object.
+            cursor (str): Cursor of the oldest message already sent, or None for the latest page.
 
         Returns:
-            QuerySet: The list of message objects.
+            tuple: The messages ordered by creation time, and the cursor for older messages.
+
+        Raises:
+            ValueError: If the cursor is malformed.
         """
-        return Message.objects.filter(conversation=conversation).order_by("created_at")
+        messages, before = keyset_page(
+            Message.objects.filter(conversation=conversation).select_related("sender"),
+            cursor,
+            settings.CHAT_HISTORY_PAGE_SIZE,
+        )
+        return messages[::-1], before
 
     @database_sync_to_async
-    def get_unseen_messages(self, conversation, username):
+    def mark_seen(self, conversation):
         """
-        Retrieves the conversation object based on the room name.
+        Marks the conversation's messages and their notifications as seen by the user.
 
-        Args:
-            room_name (str): The name of the conversation room.
+        Returns:
+            int: The number of messages that became seen.
+        """
+        return ConversationReadState.mark_seen(conversation, self.user)
+
+    @database_sync_to_async
+    def get_unread_counts(self, conversation=None):
+        """
+        Reads the user's unseen notification count, or their unseen message count in
+        ``conversation``, from the counter store.
 
         Returns:
-            Conversation: The conversation object.
-        """
-        unseen_message = Message.objects.filter(
-            conversation=conversation, is_seen=False
-        ).exclude(sender=username)
-        for i in unseen_message:
-            i.is_seen = True
-            i.save()
-            notifiction_seen = Notification.objects.filter(
-                message=i, user__username=username
+            int: The unseen count.
+        """
+        if conversation is None:
+            return counters.unread_notifications([self.user.id])[self.user.id]
+        return counters.unread_messages(conversation.id, [self.user.id])[self.user.id]
+
+    async def broadcast_message(self, conversation, message):
+        """
+        Sends a saved message to every socket subscribed to the conversation.
+        """
+        await self.channel_layer.group_send(
+            chat_group(conversation.id),
+            {
+                "type": "chat.message",
+                "conversation": conversation.conversation_name,
+                "conversation_id": conversation.id,
+                "message": MessageSerializer(message).data,
+            },
+        )
+
+
+class ChatConsumer(ChatMixin, AsyncWebsocketConsumer):
+    """
+    A consumer to handle WebSocket connections for chat functionality.
+
+    The conversation and its other participants are loaded once at connect and
+    reloaded only when the participants change, so sending a message costs the
+    message and notification inserts alone.
+
+    Attributes:
+        user (User or AnonymousUser): The user connecting to the WebSocket.
+        conversation (Conversation): The conversation of the room.
+        recipients (list): The other participants of the conversation.
+        room_group_name (str): The name of the channel layer group.
+    """
+
+    async def connect(self):
+        """
+        Handles the connection event when a client attempts to connect to the WebSocket.
+        Adds the authenticated user to the channel layer group and sends the latest page
+        of the chat history as ``{"type": "history", "messages": [...], "before": <cursor>}``.
+        """
+        self.user = self.scope["user"]
+        self.room_group_name = None
+
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        self.conversation = await self.get_member_conversation(**self.conversation_lookup())
+        if self.conversation is None:
+            await self.close()
+            return
+        self.recipients = await self.get_recipients(self.conversation)
+
+        self.room_group_name = chat_group(self.conversation.id)
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.accept()
+
+        await self.send_history(self.conversation)
+        await self.mark_seen(self.conversation)
+
+    async def disconnect(self, close):
+        """
+        Handles the disconnection event when a client disconnects from the WebSocket.
+        """
+        if self.room_group_name:
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    async def send_history(self, conversation, cursor=None):
+        """
+        Sends one page of messages older than ``cursor``, oldest first, with the cursor
+        for the page before it (None once the start of the conversation is reached).
+        """
+        try:
+            messages, before = await self.get_messages(conversation, cursor)
+        except ValueError:
+            await self.send(text_data=json.dumps({"type": "error", "error": "Invalid cursor"}))
+            return
+        message_serializer = MessageSerializer(messages, many=True)
+        await self.send(
+            text_data=json.dumps(
+                {"type": "history", "messages": message_serializer.data, "before": before}
             )
-            for notification in notifiction_seen:
-                notification.is_seen = True
-                notification.save()
+        )
 
-        return "seen"
+    async def receive(self, text_data):
+        """
+        Handles receiving messages from the WebSocket.
+
+        A ``{"command": "load_before", "cursor": <cursor>}`` frame requests an older page
+        of history; anything else is saved and broadcast as a chat message.
+        """
+        try:
+            message_data = json.loads(text_data)
+            if isinstance(message_data, dict) and message_data.get("command") == "load_before":
+                await self.send_history(self.conversation, message_data.get("cursor"))
+            else:
+                new_message = await self.save_message(
+                    message_data, self.conversation, self.recipients
+                )
+                await self.broadcast_message(self.conversation, new_message)
+        except Exception as e:
+            print(f"Error in receive method: {str(e)}")
+
+    async def participants_changed(self, event):
+        """
+        Reloads the recipients after participants were added or removed, and closes
+        the socket if the user was removed.
+        """
+        self.recipients = await self.get_recipients(self.conversation)
+        if self.recipients is None:
+            await self.close()
 
     async def chat_message(self, event):
         """
@@ -206,52 +257,294 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def get_notifications(self, username):
         """
-        Retrieves all messages for a given conversation, ordered by creation time.
+        Reads the user's unseen notification count from the counter store.
 
         Returns:
-            QuerySet: The list of message objects.
+            int: The unseen notification count.
         """
-        return Notification.objects.filter(
-            user__username=username, is_seen=False
-        ).count()
+        user_id = (
+            User.objects.filter(username=username).values_list("id", flat=True).first()
+        )
+        if user_id is None:
+            return 0
+        return counters.unread_notifications([user_id])[user_id]
 
 
-class ConversationConsumer(AsyncWebsocketConsumer):
+class ConversationConsumer(ChatMixin, AsyncWebsocketConsumer):
     async def connect(self):
-        query_string = self.scope["query_string"].decode()
-        query_params = parse_qs(query_string)
-        token_key = query_params.get("token", [None])[0]
-
-        if token_key:
-            self.user = verify_jwt_token(token_key)
-        else:
-            self.user = AnonymousUser()
+        self.user = self.scope["user"]
+        self.group_name = None
         if not self.user.is_authenticated:
             await self.close()
-        self.conversation_name = self.scope["url_route"]["kwargs"]["conversation_name"]
-        self.group_name = f"messages_{self.conversation_name}"
+            return
+
+        conversation = await self.get_member_conversation(**self.conversation_lookup())
+        if conversation is None:
+            await self.close()
+            return
 
+        self.group_name = unread_group(conversation.id)
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
 
+        count = await self.get_unread_counts(conversation)
+        await self.send(text_data=json.dumps({"count": count}))
+
+    async def disconnect(self, close_code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def send_messge_notification_count(self, event):
+        """
+        Forwards the connected user's count from a ``{"counts": {user_id: n}}`` event;
+        counts for other participants are ignored.
+        """
+        data = json.loads(event.get("value"))
+        count = data["counts"].get(str(self.user.id))
+        if count is not None:
+            await self.send(text_data=json.dumps({"count": count}))
+
+
+class StreamConsumer(ChatMixin, AsyncWebsocketConsumer):
+    """
+    A single authenticated socket multiplexing every stream a client needs.
+
+    The client subscribes to logical streams with
+    ``{"action": "subscribe", "stream": <stream>, "conversation_id": <id>}`` and leaves
+    them with ``"action": "unsubscribe"``. A conversation may be named with
+    ``"conversation": <name>`` instead of its id. Streams are:
+
+    - ``conversation``: chat messages of a conversation, as on ``ws/conversation/<id>/``.
+    - ``unread``: the user's unseen message count in a conversation, as on
+      ``ws/conversation/<id>/unread/``.
+    - ``notifications``: the user's notification badge, as on ``ws/notification/``.
+      Takes no conversation.
+
+    ``{"action": "send", "conversation_id": <id>, "message": <text>}`` sends a chat
+    message and ``{"action": "load_before", "conversation_id": <id>, "cursor": <cursor>}``
+    requests older history. Every frame sent to the client is
+    ``{"stream": <stream>, "conversation": <name>, "conversation_id": <id>,
+    "payload": <frame>}`` where the payload is what the dedicated socket would have sent.
+
+    Attributes:
+        user (User): The authenticated user.
+        conversations (dict): Conversations the client has subscribed to, by id.
+        recipients (dict): Other participants of each subscribed conversation, by id,
+            reloaded when the participants change.
+        subscriptions (set): ``(stream, conversation id)`` pairs.
+    """
+
+    STREAMS = ("conversation", "unread", "notifications")
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        self.conversations = {}
+        self.recipients = {}
+        self.subscriptions = set()
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for subscription in self.subscriptions:
+            await self.channel_layer.group_discard(
+                self.group_name(*subscription), self.channel_name
+            )
+
+    def group_name(self, stream, conversation_id):
+        if stream == "conversation":
+            return chat_group(conversation_id)
+        if stream == "unread":
+            return unread_group(conversation_id)
+        return self.user.username
+
+    def frame_lookup(self, frame):
+        """
+        Returns:
+            dict or None: The conversation lookup named by a client frame.
+
+        Raises:
+            ValueError: If the id is not an integer or the name not a string.
+        """
+        conversation_id = frame.get("conversation_id")
+        if conversation_id is not None:
+            if not isinstance(conversation_id, int) or isinstance(conversation_id, bool):
+                raise ValueError(conversation_id)
+            return {"pk": conversation_id}
+        name = frame.get("conversation")
+        if name is not None:
+            if not isinstance(name, str):
+                raise ValueError(name)
+            return {"conversation_name": name}
+        return None
+
+    def subscribed_conversation(self, lookup):
+        """
+        Returns:
+            Conversation or None: The subscribed conversation matching ``lookup``.
+        """
+        for conversation in self.conversations.values():
+            if lookup and all(
+                str(getattr(conversation, field)) == str(value)
+                for field, value in lookup.items()
+            ):
+                return conversation
+        return None
+
+    async def send_frame(self, stream, conversation, payload):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "stream": stream,
+                    "conversation": conversation and conversation.conversation_name,
+                    "conversation_id": conversation and conversation.id,
+                    "payload": payload,
+                }
+            )
+        )
+
+    async def send_error(self, error, stream=None, conversation=None):
+        await self.send_frame(stream, conversation, {"type": "error", "error": error})
+
+    async def receive(self, text_data):
         try:
-            conversation = Conversation.objects.get(
-                conversation_name=self.conversation_name
+            frame = json.loads(text_data)
+        except ValueError:
+            await self.send_error("Invalid JSON")
+            return
+        if not isinstance(frame, dict):
+            await self.send_error("Invalid frame")
+            return
+
+        action = frame.get("action")
+        stream = frame.get("stream", "conversation")
+        if stream not in self.STREAMS:
+            await self.send_error("Unknown stream", stream)
+            return
+        try:
+            lookup = None if stream == "notifications" else self.frame_lookup(frame)
+        except ValueError:
+            await self.send_error("Invalid conversation", stream)
+            return
+
+        if action == "subscribe":
+            await self.subscribe(stream, lookup)
+        elif action == "unsubscribe":
+            await self.unsubscribe(stream, self.subscribed_conversation(lookup))
+        elif action in ("send", "load_before"):
+            conversation = self.subscribed_conversation(lookup)
+            subscribed = conversation is not None and (
+                ("conversation", conversation.id) in self.subscriptions
             )
-        except Conversation.DoesNotExist:
-            await self.close()
+            if not subscribed:
+                await self.send_error("Not subscribed", "conversation")
+            elif action == "send":
+                await self.send_message(conversation, frame.get("message"))
+            else:
+                await self.send_history(conversation, frame.get("cursor"))
+        else:
+            await self.send_error("Unknown action", stream)
+
+    async def send_message(self, conversation, text):
+        """
+        Saves and broadcasts a chat message, answering with an error frame when the text
+        is not a non-empty string or the message could not be saved.
+        """
+        if not isinstance(text, str) or not text.strip():
+            await self.send_error("Invalid message", "conversation", conversation)
+            return
+        try:
+            new_message = await self.save_message(
+                text, conversation, self.recipients[conversation.id]
+            )
+        except DatabaseError as e:
+            print(f"Error in send_message method: {str(e)}")
+            await self.send_error("Message not saved", "conversation", conversation)
             return
+        await self.broadcast_message(conversation, new_message)
 
-        messages = Message.objects.filter(
-            conversation=conversation, is_seen=False
-        ).exclude(sender=self.user)
+    async def subscribe(self, stream, lookup):
+        """
+        Joins the stream's group and sends its current state: the latest history page
+        for ``conversation``, or the current count for ``unread`` and ``notifications``.
+        """
+        conversation = None
+        if stream != "notifications":
+            conversation = self.subscribed_conversation(lookup)
+            if conversation is None and lookup is not None:
+                conversation = await self.get_member_conversation(**lookup)
+            if conversation is None:
+                await self.send_error("Conversation not found", stream)
+                return
+            self.conversations[conversation.id] = conversation
+
+        key = (stream, conversation and conversation.id)
+        if key not in self.subscriptions:
+            await self.channel_layer.group_add(self.group_name(*key), self.channel_name)
+            self.subscriptions.add(key)
+
+        if stream == "conversation":
+            self.recipients[conversation.id] = await self.get_recipients(conversation)
+            await self.send_history(conversation)
+            await self.mark_seen(conversation)
+        else:
+            count = await self.get_unread_counts(conversation)
+            await self.send_frame(stream, conversation, {"count": count})
 
-        await self.send(text_data=json.dumps({"count": messages.count()}))
+    async def unsubscribe(self, stream, conversation):
+        key = (stream, conversation and conversation.id)
+        if key not in self.subscriptions:
+            return
+        self.subscriptions.discard(key)
+        await self.channel_layer.group_discard(self.group_name(*key), self.channel_name)
+        if stream == "conversation":
+            self.recipients.pop(conversation.id, None)
+        if conversation and not any(
+            conversation_id == conversation.id for _, conversation_id in self.subscriptions
+        ):
+            self.conversations.pop(conversation.id, None)
+
+    async def send_history(self, conversation, cursor=None):
+        try:
+            messages, before = await self.get_messages(conversation, cursor)
+        except ValueError:
+            await self.send_error("Invalid cursor", "conversation", conversation)
+            return
+        await self.send_frame(
+            "conversation",
+            conversation,
+            {
+                "type": "history",
+                "messages": MessageSerializer(messages, many=True).data,
+                "before": before,
+            },
+        )
 
-    async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+    async def participants_changed(self, event):
+        conversation = self.conversations.get(event["conversation_id"])
+        if conversation is None or conversation.id not in self.recipients:
+            return
+        recipients = await self.get_recipients(conversation)
+        if recipients is None:
+            for stream in self.STREAMS[:2]:
+                await self.unsubscribe(stream, conversation)
+            await self.send_error("Removed from conversation", "conversation", conversation)
+        else:
+            self.recipients[conversation.id] = recipients
+
+    async def chat_message(self, event):
+        conversation = self.conversations.get(event["conversation_id"])
+        if conversation is not None:
+            await self.send_frame("conversation", conversation, event["message"])
+
+    async def send_notification(self, event):
+        data = json.loads(event.get("value"))
+        await self.send_frame("notifications", None, {"count": data["count"]})
 
     async def send_messge_notification_count(self, event):
         data = json.loads(event.get("value"))
-        count = data["message_useen_count"]
-        await self.send(text_data=json.dumps({"count": count}))
+        count = data["counts"].get(str(self.user.id))
+        conversation = self.conversations.get(event["conversation_id"])
+        if count is not None and conversation is not None:
+            await self.send_frame("unread", conversation, {"count": count})
@@ -0,0 +1,282 @@
+"""
+Unread counters for notification badges and per-conversation unseen messages.
+
+Counters live in a counter store (``settings.UNREAD_COUNTER_BACKEND``) and are
+updated incrementally when messages are sent or seen, so pushing a badge update
+does not have to count rows. A counter missing from the store is seeded from the
+database the first time it is read; ``rebuild_unread_counters`` reconciles every
+counter with the database after drift.
+
+Seeding is set-if-absent, so it never overwrites a counter another process seeded or
+updated meanwhile. An increment landing between the database read and the seed still
+finds no key and is lost, so seeded counters expire after
+``settings.UNREAD_COUNTER_SEED_TTL`` seconds and are then counted again.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count
+
+from core.backends import backend_loader
+from .models import Conversation, Message, Notification
+
+KEY_PREFIX = "unread:"
+
+
+def notification_key(user_id):
+    return f"{KEY_PREFIX}notifications:{user_id}"
+
+
+def message_key(conversation_id, user_id):
+    return f"{KEY_PREFIX}messages:{conversation_id}:{user_id}"
+
+
+class BaseCounterStore:
+    """
+    Interface for counter storage. Keys are strings, values non-negative integers.
+    """
+
+    def get_many(self, keys):
+        """
+        Returns ``{key: value}`` for the keys present in the store.
+        """
+        raise NotImplementedError
+
+    def set_many(self, mapping):
+        """
+        Sets every key of ``mapping`` to its value.
+        """
+        raise NotImplementedError
+
+    def add_many(self, mapping, timeout):
+        """
+        Sets the keys of ``mapping`` that are not in the store yet, expiring after
+        ``timeout`` seconds.
+        """
+        raise NotImplementedError
+
+    def incr_many(self, keys, delta):
+        """
+        Adds ``delta`` to the keys present in the store, never going below zero and
+        keeping their expiry. Missing keys stay missing so they are seeded from the
+        database on next read.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Removes every counter.
+        """
+        raise NotImplementedError
+
+
+class InMemoryCounterStore(BaseCounterStore):
+    """
+    Keeps counters in a dict guarded by a lock, so updates are atomic across the
+    threads of one process. Each process has its own counters, which other processes
+    never see change.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.expires = {}
+
+    def expire(self, keys):
+        now = time.monotonic()
+        for key in keys:
+            if self.expires.get(key, now) < now:
+                del self.counters[key], self.expires[key]
+
+    def get_many(self, keys):
+        with self.lock:
+            self.expire(keys)
+            return {key: self.counters[key] for key in keys if key in self.counters}
+
+    def set_many(self, mapping):
+        with self.lock:
+            self.counters.update(mapping)
+            for key in mapping:
+                self.expires.pop(key, None)
+
+    def add_many(self, mapping, timeout):
+        with self.lock:
+            self.expire(mapping)
+            expires = time.monotonic() + timeout
+            for key, value in mapping.items():
+                if key not in self.counters:
+                    self.counters[key] = value
+                    self.expires[key] = expires
+
+    def incr_many(self, keys, delta):
+        with self.lock:
+            self.expire(keys)
+            for key in keys:
+                if key in self.counters:
+                    self.counters[key] = max(0, self.counters[key] + delta)
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.expires.clear()
+
+
+class RedisCounterStore(BaseCounterStore):
+    """
+    Keeps counters in Redis at ``settings.UNREAD_COUNTER_REDIS_URL``, shared by every
+    worker process.
+    """
+
+    INCR_EXISTING = """
+    for _, key in ipairs(KEYS) do
+        local value = redis.call('GET', key)
+        if value then
+            redis.call('SET', key, math.max(0, tonumber(value) + tonumber(ARGV[1])), 'KEEPTTL')
+        end
+    end
+    """
+
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis.from_url(settings.UNREAD_COUNTER_REDIS_URL)
+        self.incr_existing = self.client.register_script(self.INCR_EXISTING)
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        values = self.client.mget(keys)
+        return {key: int(value) for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, mapping):
+        if mapping:
+            self.client.mset(mapping)
+
+    def add_many(self, mapping, timeout):
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipeline.set(key, value, nx=True, ex=timeout)
+        pipeline.execute()
+
+    def incr_many(self, keys, delta):
+        if keys:
+            self.incr_existing(keys=keys, args=[delta])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{KEY_PREFIX}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+get_store = backend_loader("UNREAD_COUNTER_BACKEND")
+
+
+def seed(store, counts):
+    """
+    Stores database counts for counters that are still missing, then reads back what
+    the store holds, which may be a value another process seeded first.
+
+    Returns:
+        dict: ``{key: value}`` for every key of ``counts``.
+    """
+    store.add_many(counts, settings.UNREAD_COUNTER_SEED_TTL)
+    return {**counts, **store.get_many(list(counts))}
+
+
+def unread_notifications(user_ids):
+    """
+    Returns ``{user_id: unseen notification count}``, seeding missing counters.
+    """
+    store = get_store()
+    keys = {notification_key(user_id): user_id for user_id in user_ids}
+    cached = store.get_many(list(keys))
+    missing = [user_id for key, user_id in keys.items() if key not in cached]
+    if missing:
+        counts = dict(
+            Notification.objects.filter(user__in=missing, is_seen=False)
+            .values("user")
+            .annotate(count=Count("id"))
+            .values_list("user", "count")
+        )
+        seeded = {notification_key(user_id): counts.get(user_id, 0) for user_id in missing}
+        cached.update(seed(store, seeded))
+    return {user_id: cached[key] for key, user_id in keys.items()}
+
+
+def unread_messages(conversation_id, user_ids):
+    """
+    Returns ``{user_id: unseen message count}`` for one conversation, seeding missing
+    counters. A user's unseen messages are the unseen ones sent by someone else.
+    """
+    store = get_store()
+    keys = {message_key(conversation_id, user_id): user_id for user_id in user_ids}
+    cached = store.get_many(list(keys))
+    missing = [user_id for key, user_id in keys.items() if key not in cached]
+    if missing:
+        by_sender = dict(
+            Message.objects.filter(conversation=conversation_id, is_seen=False)
+            .values("sender")
+            .annotate(count=Count("id"))
+            .values_list("sender", "count")
+        )
+        total = sum(by_sender.values())
+        seeded = {
+            message_key(conversation_id, user_id): total - by_sender.get(user_id, 0)
+            for user_id in missing
+        }
+        cached.update(seed(store, seeded))
+    return {user_id: cached[key] for key, user_id in keys.items()}
+
+
+def add_notifications(user_ids, delta):
+    get_store().incr_many([notification_key(user_id) for user_id in user_ids], delta)
+
+
+def add_messages(conversation_id, user_ids, delta):
+    get_store().incr_many(
+        [message_key(conversation_id, user_id) for user_id in user_ids], delta
+    )
+
+
+def reset_messages(conversation_id, user_id):
+    get_store().set_many({message_key(conversation_id, user_id): 0})
+
+
+def rebuild():
+    """
+    Replaces every counter with a fresh count from the database.
+
+    Returns:
+        int: The number of counters written.
+    """
+    counters = {
+        notification_key(user_id): count
+        for user_id, count in Notification.objects.filter(is_seen=False)
+        .values("user")
+        .annotate(count=Count("id"))
+        .values_list("user", "count")
+    }
+    unseen = (
+        Message.objects.filter(is_seen=False)
+        .values("conversation", "sender")
+        .annotate(count=Count("id"))
+        .values_list("conversation", "sender", "count")
+    )
+    participants = Conversation.participants.through.objects.values_list(
+        "conversation_id", "user_id"
+    )
+    by_conversation = {}
+    for conversation_id, sender_id, count in unseen:
+        by_conversation.setdefault(conversation_id, {})[sender_id] = count
+    for conversation_id, user_id in participants:
+        by_sender = by_conversation.get(conversation_id, {})
+        counters[message_key(conversation_id, user_id)] = (
+            sum(by_sender.values()) - by_sender.get(user_id, 0)
+        )
+
+    store = get_store()
+    store.clear()
+    store.set_many(counters)
+    return len(counters)
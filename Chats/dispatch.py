@@ -0,0 +1,186 @@
+"""
+Notification dispatch: chat events and the outbox that publishes them.
+
+Code that changes chat state sends one of the events below once its transaction has
+committed; the receivers in ``Chats.signals`` update the unread counters and queue
+count updates on the outbox. The outbox (``settings.NOTIFICATION_OUTBOX``) delivers
+them to the channel layer, so a slow or unreachable channel layer never holds up
+the thread that saved the message.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from itertools import islice
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.dispatch import Signal
+
+from core.backends import backend_loader
+
+logger = logging.getLogger(__name__)
+
+# Sent with ``users``: notifications were created for each of them.
+notifications_created = Signal()
+# Sent with ``message`` and ``recipient_ids``: a chat message was created.
+message_created = Signal()
+# Sent with ``conversation``, ``user`` and ``notifications_seen``: the user read the
+# conversation up to its newest message.
+conversation_seen = Signal()
+
+
+def chat_group(conversation_id):
+    """
+    Returns:
+        str: The channel layer group receiving a conversation's chat messages.
+    """
+    return f"chat_{conversation_id}"
+
+
+def unread_group(conversation_id):
+    """
+    Returns:
+        str: The channel layer group receiving a conversation's unseen message counts.
+    """
+    return f"messages_{conversation_id}"
+
+
+class BaseOutbox:
+    """
+    Interface for delivering channel layer messages to groups.
+    """
+
+    def publish(self, group, message):
+        """
+        Queues ``message`` for delivery to ``group``.
+
+        Returns:
+            bool: False if the message was dropped.
+        """
+        raise NotImplementedError
+
+
+class InlineOutbox(BaseOutbox):
+    """
+    Delivers each message in the calling thread before ``publish`` returns, so the
+    caller waits on the channel layer but messages arrive in order and none are
+    dropped. Works with any channel layer, including ``InMemoryChannelLayer``.
+    """
+
+    def publish(self, group, message):
+        async_to_sync(get_channel_layer().group_send)(group, message)
+        return True
+
+
+class ThreadedOutbox(BaseOutbox):
+    """
+    Delivers messages from a background thread in batches of
+    ``NOTIFICATION_OUTBOX_BATCH_SIZE``.
+
+    Messages waiting for delivery are keyed by group and message type, so a newer
+    count for a group replaces an older one that has not been sent yet; per-user
+    ``{"counts": ...}`` maps are merged instead (see ``merge``). Once
+    ``NOTIFICATION_OUTBOX_MAX_PENDING`` keys are waiting, messages for new keys are
+    dropped instead of queued. Counts are sent again on the next change or reconnect,
+    so a dropped update only delays a badge.
+
+    The delivery thread runs its own event loop, so the channel layer must be safe to
+    use across threads, as ``RedisChannelLayer`` is. Use ``InlineOutbox`` with
+    ``InMemoryChannelLayer``.
+    """
+
+    def __init__(self):
+        self.batch_size = settings.NOTIFICATION_OUTBOX_BATCH_SIZE
+        self.max_pending = settings.NOTIFICATION_OUTBOX_MAX_PENDING
+        self.timeout = settings.NOTIFICATION_OUTBOX_TIMEOUT
+        self.condition = threading.Condition()
+        self.pending = {}
+        self.dropped = 0
+        self.thread = None
+
+    def publish(self, group, message):
+        key = (group, message["type"])
+        with self.condition:
+            if key not in self.pending and len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                logger.warning("Notification outbox full, dropped a message for %s", group)
+                return False
+            waiting = self.pending.get(key)
+            self.pending[key] = message if waiting is None else self.merge(waiting, message)
+            self.start()
+            self.condition.notify()
+        return True
+
+    def merge(self, waiting, message):
+        """
+        Combines ``message`` with the one already waiting under the same key. When both
+        carry per-user counts as ``{"counts": {user_id: n}}`` the maps are merged, newer
+        counts winning, so an update for some users never hides another user's.
+
+        Returns:
+            dict: The message to deliver in place of both.
+        """
+        try:
+            older, newer = json.loads(waiting["value"]), json.loads(message["value"])
+        except (KeyError, TypeError, ValueError):
+            return message
+        if not (isinstance(older, dict) and isinstance(newer, dict)):
+            return message
+        if "counts" not in older or "counts" not in newer:
+            return message
+        counts = {**older["counts"], **newer["counts"]}
+        return {**message, "value": json.dumps({**newer, "counts": counts})}
+
+    def start(self):
+        """
+        Starts the delivery thread if it is not running. Call with the lock held.
+        """
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self.run, name="notification-outbox", daemon=True
+            )
+            self.thread.start()
+
+    def take_batch(self):
+        """
+        Removes up to ``batch_size`` waiting messages, oldest key first.
+
+        Returns:
+            list: ``(group, message)`` pairs.
+        """
+        with self.condition:
+            keys = list(islice(self.pending, self.batch_size))
+            return [(key[0], self.pending.pop(key)) for key in keys]
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+            loop.run_until_complete(self.send_batch(self.take_batch()))
+
+    async def send_batch(self, batch):
+        """
+        Sends a batch concurrently, giving each message at most ``timeout`` seconds.
+        Failed messages are logged and not retried.
+        """
+        channel_layer = get_channel_layer()
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(channel_layer.group_send(group, message), self.timeout)
+                for group, message in batch
+            ),
+            return_exceptions=True,
+        )
+        failed = sum(isinstance(result, BaseException) for result in results)
+        if failed:
+            logger.warning(
+                "Notification outbox failed to deliver %d of %d messages", failed, len(batch)
+            )
+
+
+get_outbox = backend_loader("NOTIFICATION_OUTBOX")
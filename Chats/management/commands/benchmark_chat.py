@@ -0,0 +1,332 @@
+"""
+Management command load-testing the real-time chat path offline.
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict, deque
+
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.core.cache import caches
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from Chats.models import Conversation
+from Users.models import User
+from Users.views import get_tokens_for_user
+
+
+class QueryCounter:
+    """
+    Counts the statements executed on every database connection it is installed on.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+class SimulatedClient:
+    """
+    One user holding a chat socket on their direct conversation and a notification
+    socket, recording when chat messages and badge updates arrive.
+    """
+
+    def __init__(self, user, token, conversation):
+        self.user = user
+        self.token = token
+        self.conversation = conversation
+        self.chat = None
+        self.notifications = None
+        self.readers = []
+        self.arrivals = {}
+        self.waiters = {}
+        self.badges = []
+
+    async def connect(self, application):
+        """
+        Opens both sockets and waits for their first frame.
+
+        Returns:
+            tuple: Seconds until the chat history and until the first badge arrived.
+        """
+        start = time.perf_counter()
+        self.chat = WebsocketCommunicator(
+            application, f"/ws/conversation/{self.conversation.id}/?token={self.token}"
+        )
+        connected, _ = await self.chat.connect(timeout=30)
+        if not connected:
+            raise RuntimeError(f"Chat socket of {self.user.username} was refused")
+        await self.chat.receive_from(timeout=30)
+        chat_latency = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.notifications = WebsocketCommunicator(
+            application, f"/ws/notification/{self.user.username}/"
+        )
+        await self.notifications.connect(timeout=30)
+        await self.notifications.receive_from(timeout=30)
+        badge_latency = time.perf_counter() - start
+
+        self.readers = [
+            asyncio.ensure_future(self.read_chat()),
+            asyncio.ensure_future(self.read_badges()),
+        ]
+        return chat_latency, badge_latency
+
+    async def read_chat(self):
+        # Read the queue directly: a receive timeout would cancel the consumer.
+        while True:
+            message = await self.chat.output_queue.get()
+            if message["type"] != "websocket.send":
+                return
+            text = json.loads(message["text"]).get("text") or ""
+            if text.startswith("bench "):
+                message_id = int(text.split()[1])
+                self.arrivals[message_id] = time.perf_counter()
+                waiter = self.waiters.pop(message_id, None)
+                if waiter is not None:
+                    waiter.set()
+
+    async def read_badges(self):
+        while True:
+            message = await self.notifications.output_queue.get()
+            if message["type"] != "websocket.send":
+                return
+            self.badges.append(time.perf_counter())
+
+    async def disconnect(self):
+        for reader in self.readers:
+            reader.cancel()
+        for communicator in (self.chat, self.notifications):
+            if communicator is not None:
+                await communicator.disconnect()
+
+
+def percentiles(samples):
+    """
+    Returns:
+        dict: p50, p95 and p99 of ``samples`` in milliseconds.
+    """
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49] * 1000, "p95": cuts[94] * 1000, "p99": cuts[98] * 1000}
+
+
+class Command(BaseCommand):
+    """
+    Seeds a throwaway test database, serves ``Insta_app.asgi.application`` with the
+    in-memory channel layer and drives it with simulated WebSocket clients. Each client
+    is one user with a ChatConsumer socket on a direct conversation and a
+    NotificationConsumer socket. Reports connect latency, chat fan-out and badge
+    latency percentiles, throughput and database statements per message. Nothing
+    leaves the process and the configured database is never touched.
+
+    Usage:
+        python manage.py benchmark_chat [--clients 1000] [--messages 2000]
+            [--concurrency 100] [--seed 0] [--outbox Chats.dispatch.InlineOutbox]
+
+    The in-memory channel layer is not thread-safe, so count updates are delivered
+    with InlineOutbox by default; ``--outbox Chats.dispatch.ThreadedOutbox`` measures
+    the production outbox at the cost of occasional late wake-ups.
+    """
+
+    help = "Load-test chat sockets in process and report latency and query counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=1000, help="Simulated users.")
+        parser.add_argument("--messages", type=int, default=2000)
+        parser.add_argument(
+            "--concurrency", type=int, default=100, help="Connects and sends in flight."
+        )
+        parser.add_argument("--timeout", type=float, default=30, help="Seconds per delivery.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--outbox",
+            default="Chats.dispatch.InlineOutbox",
+            help="NOTIFICATION_OUTBOX to deliver count updates with.",
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        benchmark_settings = override_settings(
+            CHANNEL_LAYERS={
+                "default": {
+                    "BACKEND": "channels.layers.InMemoryChannelLayer",
+                    "CONFIG": {"capacity": 1000},
+                }
+            },
+            UNREAD_COUNTER_BACKEND="Chats.counters.InMemoryCounterStore",
+            NOTIFICATION_OUTBOX=options["outbox"],
+        )
+        try:
+            with benchmark_settings:
+                caches[settings.JWT_AUTH_CACHE].clear()
+                clients = self.seed(options["clients"] - options["clients"] % 2)
+                # Consumers run their queries on this thread, any others on new
+                # connections.
+                queries = QueryCounter()
+                queries.install(connection=connection)
+                connection_created.connect(queries.install)
+                try:
+                    report = async_to_sync(self.run)(clients, queries, options)
+                finally:
+                    connection_created.disconnect(queries.install)
+                    connection.execute_wrappers.remove(queries)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.print_report(report)
+
+    def seed(self, client_count):
+        """
+        Creates one user per client and pairs them into direct conversations.
+
+        Returns:
+            list: The simulated clients.
+        """
+        users = User.objects.bulk_create(
+            [User(username=f"bench{i}") for i in range(client_count)]
+        )
+        conversations = Conversation.objects.bulk_create(
+            [
+                Conversation(
+                    conversation_name=f"{first.username}_{second.username}",
+                    direct_key=Conversation.direct_key_for(first.id, second.id),
+                )
+                for first, second in zip(users[::2], users[1::2])
+            ]
+        )
+        Conversation.participants.through.objects.bulk_create(
+            [
+                Conversation.participants.through(conversation=conversation, user=user)
+                for conversation, pair in zip(conversations, zip(users[::2], users[1::2]))
+                for user in pair
+            ]
+        )
+        return [
+            SimulatedClient(user, get_tokens_for_user(user)["access"], conversations[i // 2])
+            for i, user in enumerate(users)
+        ]
+
+    async def run(self, clients, queries, options):
+        """
+        Connects every client, then sends messages between random conversation partners.
+
+        Returns:
+            dict: The measurements.
+        """
+        from Insta_app.asgi import application
+
+        queries.count = 0
+        limit = asyncio.Semaphore(options["concurrency"])
+
+        async def connect(client):
+            async with limit:
+                return await client.connect(application)
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(connect(client) for client in clients))
+        connect_elapsed = time.perf_counter() - start
+        connect_queries = queries.count
+
+        partner = {}
+        for first, second in zip(clients[::2], clients[1::2]):
+            partner[first], partner[second] = second, first
+        rng = random.Random(options["seed"])
+        senders = [rng.choice(clients) for _ in range(options["messages"])]
+        sent_at = {}
+        badge_sent = defaultdict(deque)
+        lost = 0
+
+        async def send(message_id, sender):
+            nonlocal lost
+            recipient = partner[sender]
+            async with limit:
+                delivered = asyncio.Event()
+                recipient.waiters[message_id] = delivered
+                sent_at[message_id] = time.perf_counter()
+                badge_sent[recipient].append(sent_at[message_id])
+                await sender.chat.send_to(text_data=json.dumps(f"bench {message_id}"))
+                try:
+                    await asyncio.wait_for(delivered.wait(), options["timeout"])
+                except asyncio.TimeoutError:
+                    lost += 1
+
+        queries.count = 0
+        start = time.perf_counter()
+        await asyncio.gather(*(send(i, sender) for i, sender in enumerate(senders)))
+        send_elapsed = time.perf_counter() - start
+        # Let the last badge updates arrive before disconnecting.
+        await asyncio.sleep(0.2)
+        send_queries = queries.count
+
+        for client in clients:
+            await client.disconnect()
+
+        fan_out = [
+            partner[sender].arrivals[i] - sent_at[i]
+            for i, sender in enumerate(senders)
+            if i in partner[sender].arrivals
+        ]
+        badge = [
+            arrived - sent
+            for client, sends in badge_sent.items()
+            for sent, arrived in zip(sends, client.badges)
+        ]
+        delivered = len(fan_out)
+        return {
+            "clients": len(clients),
+            "connect_chat": percentiles([chat for chat, _ in latencies]),
+            "connect_notification": percentiles([badge for _, badge in latencies]),
+            "connect_rate": len(clients) / connect_elapsed,
+            "connect_queries": connect_queries / len(clients),
+            "messages": len(senders),
+            "delivered": delivered,
+            "lost": lost,
+            "fan_out": percentiles(fan_out),
+            "badge": percentiles(badge),
+            "throughput": delivered / send_elapsed,
+            "message_queries": send_queries / max(len(senders), 1),
+        }
+
+    def print_report(self, report):
+        def line(label, values):
+            self.stdout.write(
+                f"  {label:<24} p50 {values['p50']:8.2f} ms   "
+                f"p95 {values['p95']:8.2f} ms   p99 {values['p99']:8.2f} ms"
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Connect ({report['clients']} clients)"))
+        line("chat socket", report["connect_chat"])
+        line("notification socket", report["connect_notification"])
+        self.stdout.write(f"  {'rate':<24} {report['connect_rate']:.1f} clients/s")
+        self.stdout.write(f"  {'queries per client':<24} {report['connect_queries']:.2f}")
+
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                f"Messages ({report['delivered']}/{report['messages']} delivered, "
+                f"{report['lost']} timed out)"
+            )
+        )
+        line("fan-out to recipient", report["fan_out"])
+        line("badge update", report["badge"])
+        self.stdout.write(f"  {'throughput':<24} {report['throughput']:.1f} messages/s")
+        self.stdout.write(f"  {'queries per message':<24} {report['message_queries']:.2f}")
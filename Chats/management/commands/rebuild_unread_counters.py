@@ -0,0 +1,24 @@
+"""
+Management command to reconcile the unread counters with the database.
+"""
+
+from django.core.management.base import BaseCommand
+
+from Chats import counters
+
+
+class Command(BaseCommand):
+    """
+    Replaces every unread notification and unseen message counter in the counter
+    store with a fresh count from the Notification and Message tables. Only useful
+    with a store shared between processes, such as RedisCounterStore.
+
+    Usage:
+        python manage.py rebuild_unread_counters
+    """
+
+    help = "Recompute unread notification and message counters."
+
+    def handle(self, *args, **options):
+        written = counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} unread counters."))
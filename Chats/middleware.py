@@ -0,0 +1,45 @@
+"""
+Channels middleware authenticating WebSocket connections with the project's JWTs.
+"""
+
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import APIException
+
+from Posts.management.authentication import JWTAuthentication
+
+
+@database_sync_to_async
+def authenticate_token(token):
+    """
+    Authenticates the token in the database thread pool: the verified-token cache
+    may be Redis and a miss queries the database, and neither may block the event loop.
+
+    Returns:
+        User or AnonymousUser: The authenticated user, or AnonymousUser if the token is invalid.
+    """
+    try:
+        user, payload = JWTAuthentication.authenticate_token(token)
+    except APIException:
+        return AnonymousUser()
+    return user
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Populates ``scope["user"]`` from the ``token`` query string parameter.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        query_params = parse_qs(scope["query_string"].decode())
+        token = query_params.get("token", [None])[0]
+
+        if not token:
+            scope["user"] = AnonymousUser()
+        else:
+            scope["user"] = await authenticate_token(token)
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-17 18:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chats', '0004_message_is_seen'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', '-created_at'], name='message_conv_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_seen', False)), fields=['conversation', 'sender'], name='message_unseen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_seen', False)), fields=['user'], name='notification_unseen_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-17 19:06
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_direct_keys(apps, schema_editor):
+    Conversation = apps.get_model('Chats', 'Conversation')
+    participants = defaultdict(set)
+    for conversation_id, user_id in Conversation.participants.through.objects.values_list(
+        'conversation_id', 'user_id'
+    ):
+        participants[conversation_id].add(user_id)
+
+    # The oldest conversation of each pair becomes its direct conversation.
+    keyed = {}
+    for conversation_id in sorted(participants):
+        users = participants[conversation_id]
+        if len(users) != 2:
+            continue
+        low, high = sorted(users)
+        keyed.setdefault(f'{low}:{high}', conversation_id)
+    for direct_key, conversation_id in keyed.items():
+        Conversation.objects.filter(pk=conversation_id).update(direct_key=direct_key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chats', '0006_conversationreadstate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='direct_key',
+            field=models.CharField(blank=True, editable=False, max_length=41, null=True, unique=True),
+        ),
+        migrations.RunPython(populate_direct_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['conversation_name'], name='conversation_name_idx'),
+        ),
+    ]
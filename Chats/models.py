@@ -2,10 +2,62 @@
 Models for handling chat conversations and messages.
 """
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 
 from core.models import BaseModel
 from Users.models import User
+from .dispatch import conversation_seen, message_created, notifications_created
+
+
+class ConversationQuerySet(models.QuerySet):
+    """
+    QuerySet for Conversation with helpers for the inbox read path.
+    """
+
+    def for_inbox(self, user):
+        """
+        Returns the conversations of ``user`` annotated with ``last_activity`` (the
+        time of the newest message, or of creation for empty conversations) and
+        ``unread_count`` (messages from others not seen yet). The newest message is
+        prefetched as ``latest_messages`` and the other participants as
+        ``other_participants``, so a page costs a fixed number of queries.
+        """
+        newest = Message.objects.filter(conversation=OuterRef("pk")).order_by(
+            "-created_at", "-id"
+        )
+        unseen = (
+            Message.objects.filter(conversation=OuterRef("pk"), is_seen=False)
+            .exclude(sender=user)
+            .order_by()
+            .values("conversation")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return (
+            self.filter(participants=user)
+            .annotate(
+                last_activity=Coalesce(
+                    Subquery(newest.values("created_at")[:1]), F("created_at")
+                ),
+                unread_count=Coalesce(Subquery(unseen, output_field=IntegerField()), 0),
+            )
+            .prefetch_related(
+                Prefetch(
+                    "messages",
+                    queryset=Message.objects.select_related("sender").order_by(
+                        "-created_at", "-id"
+                    )[:1],
+                    to_attr="latest_messages",
+                ),
+                Prefetch(
+                    "participants",
+                    queryset=User.objects.exclude(pk=user.pk),
+                    to_attr="other_participants",
+                ),
+            )
+        )
 
 
 class Conversation(BaseModel):
@@ -14,12 +66,24 @@ class Conversation(BaseModel):
 
     Attributes:
         conversation_name (str): The name of the conversation.
+        direct_key (str): ``"<lower user id>:<higher user id>"`` for direct conversations
+            between two users, None otherwise. Unique, so each pair has one conversation.
         participants (ManyToManyField): The users participating in the conversation.
     """
     
     conversation_name = models.TextField(blank=True, null=True)
+    direct_key = models.CharField(
+        max_length=41, unique=True, null=True, blank=True, editable=False
+    )
     participants = models.ManyToManyField(User, related_name='conversations')
 
+    objects = ConversationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["conversation_name"], name="conversation_name_idx"),
+        ]
+
     def __str__(self) -> str:
         """
         Returns a string representation of the conversation.
@@ -29,6 +93,41 @@ class Conversation(BaseModel):
         """
         return self.conversation_name
 
+    @staticmethod
+    def direct_key_for(user_id, other_user_id):
+        """
+        Returns:
+            str: The direct key of the conversation between two users.
+        """
+        low, high = sorted((user_id, other_user_id))
+        return f"{low}:{high}"
+
+    @classmethod
+    def get_or_create_direct(cls, user, other_user):
+        """
+        Returns the direct conversation between two users, creating it if needed.
+
+        Safe against both users opening the chat at once: the losing insert hits the
+        unique direct_key and the existing conversation is returned instead.
+
+        Returns:
+            tuple: ``(conversation, created)``.
+        """
+        direct_key = cls.direct_key_for(user.id, other_user.id)
+        conversation = cls.objects.filter(direct_key=direct_key).first()
+        if conversation is not None:
+            return conversation, False
+        try:
+            with transaction.atomic():
+                conversation = cls.objects.create(
+                    conversation_name=f"{other_user.username}_{user.username}",
+                    direct_key=direct_key,
+                )
+                conversation.participants.set([user.id, other_user.id])
+        except IntegrityError:
+            return cls.objects.get(direct_key=direct_key), False
+        return conversation, True
+
 
 class Message(BaseModel):
     """
@@ -44,6 +143,20 @@ class Message(BaseModel):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     text = models.TextField()
     is_seen = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["conversation", "-created_at"],
+                name="message_conv_recent_idx",
+            ),
+            models.Index(
+                fields=["conversation", "sender"],
+                condition=models.Q(is_seen=False),
+                name="message_unseen_idx",
+            ),
+        ]
+
     def __str__(self) -> str:
         """
         Returns a string representation of the message.
@@ -53,6 +166,42 @@ class Message(BaseModel):
         """
         return self.text
 
+    @classmethod
+    def send(cls, conversation, sender, text, recipients):
+        """
+        Saves a message and one notification per recipient in a single transaction,
+        with one insert each. Both are bulk inserts, so ``message_created`` and
+        ``notifications_created`` are sent explicitly once the transaction commits
+        instead of relying on post_save.
+
+        Args:
+            conversation (Conversation): The conversation of the message.
+            sender (User): The user sending the message.
+            text (str): The content of the message.
+            recipients (list): The other participants of the conversation.
+
+        Returns:
+            Message: The saved message.
+        """
+        with transaction.atomic():
+            (message,) = cls.objects.bulk_create(
+                [cls(conversation=conversation, sender=sender, text=text)]
+            )
+            Notification.objects.bulk_create(
+                [Notification(message=message, user=user) for user in recipients]
+            )
+            transaction.on_commit(
+                lambda: message_created.send(
+                    sender=cls,
+                    message=message,
+                    recipient_ids=[user.id for user in recipients],
+                )
+            )
+            transaction.on_commit(
+                lambda: notifications_created.send(sender=Notification, users=recipients)
+            )
+        return message
+
 
 class Notification(BaseModel):
     """
@@ -65,7 +214,92 @@ class Notification(BaseModel):
     message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name= 'notifications')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
     is_seen = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user"],
+                condition=models.Q(is_seen=False),
+                name="notification_unseen_idx",
+            ),
+        ]
     
     def __str__(self) -> str:
         return self.user.username
-    
\ No newline at end of file
+    
+
+
+class ConversationReadState(BaseModel):
+    """
+    A model holding the read watermark of one participant in a conversation.
+
+    Attributes:
+        conversation (ForeignKey): The conversation being read.
+        user (ForeignKey): The participant.
+        last_seen_message_id (int): Id of the newest message the participant has seen.
+    """
+
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='read_states')
+    last_seen_message_id = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["conversation", "user"], name="unique_read_state"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} read {self.conversation_id} up to {self.last_seen_message_id}"
+
+    @classmethod
+    def mark_seen(cls, conversation, user):
+        """
+        Marks every message of the conversation up to the newest one as seen by ``user``,
+        together with the matching notifications, using a constant number of
+        set-based statements. ``conversation_seen`` is sent once the transaction
+        commits.
+
+        Returns:
+            int: The number of messages that became seen.
+        """
+        with transaction.atomic():
+            last_message_id = (
+                Message.objects.filter(conversation=conversation)
+                .order_by("-id")
+                .values_list("id", flat=True)
+                .first()
+            )
+            if last_message_id is None:
+                return 0
+            state, created = cls.objects.select_for_update().get_or_create(
+                conversation=conversation, user=user
+            )
+            if state.last_seen_message_id >= last_message_id:
+                return 0
+
+            seen = (
+                Message.objects.filter(
+                    conversation=conversation,
+                    is_seen=False,
+                    id__gt=state.last_seen_message_id,
+                    id__lte=last_message_id,
+                )
+                .exclude(sender=user)
+                .update(is_seen=True)
+            )
+            notified = Notification.objects.filter(
+                user=user,
+                is_seen=False,
+                message__conversation=conversation,
+                message_id__lte=last_message_id,
+            ).update(is_seen=True)
+            cls.objects.filter(pk=state.pk).update(last_seen_message_id=last_message_id)
+
+            transaction.on_commit(
+                lambda: conversation_seen.send(
+                    sender=cls, conversation=conversation, user=user, notifications_seen=notified
+                )
+            )
+        return seen
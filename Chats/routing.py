@@ -6,6 +6,9 @@ from django.urls import path
 from . import consumers
 
 websocket_urlpatterns = [
+    path('ws/stream/', consumers.StreamConsumer.as_asgi()),
+    path('ws/conversation/<int:conversation_id>/', consumers.ChatConsumer.as_asgi()),
+    path('ws/conversation/<int:conversation_id>/unread/', consumers.ConversationConsumer.as_asgi()),
     path('ws/chat/<str:conversation_name>/', consumers.ChatConsumer.as_asgi()),
     path('ws/notification/<str:username>/', consumers.NotificationConsumer.as_asgi()),
     path('ws/notification/reciever/<str:conversation_name>/', consumers.ConversationConsumer.as_asgi()),
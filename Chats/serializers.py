@@ -2,13 +2,15 @@
 Serializers for converting Django model instances to JSON format.
 """
 
+from django.conf import settings
+from django.utils.text import Truncator
 from rest_framework import serializers
 from .models import (
     Conversation,
     Message,
 )
 from Users.models import User
-from urllib.parse import urljoin
+from core import images
 
 class UserDataSerializer(serializers.ModelSerializer):
     """
@@ -26,7 +28,7 @@ class UserDataSerializer(serializers.ModelSerializer):
     
     def get_profile_image(self, obj):
         """
-        Method to get the profile image URL for a user.
+        Method to get the profile image URL for a user, sized by ``image_size``.
 
         Args:
             obj (User): The User instance.
@@ -35,12 +37,7 @@ class UserDataSerializer(serializers.ModelSerializer):
             str or None: The profile image URL if available, otherwise None.
         """
         request = self.context.get('request')
-        profile_image = obj.profile_img
-
-        if profile_image and request:
-            return urljoin(request.build_absolute_uri('/'), profile_image.url)
-
-        return None
+        return images.image_url(obj.profile_img, obj.profile_img_variants, request)
 
 class SendConversationSerializer(serializers.ModelSerializer):
     """
@@ -66,6 +63,8 @@ class SendConversationSerializer(serializers.ModelSerializer):
         Returns:
             list: Serialized data of participants' user data.
         """
+        if hasattr(obj, 'other_participants'):
+            return UserDataSerializer(obj.other_participants, context=self.context, many=True).data
         request = self.context.get('request', None)
         if request:
             logged_in_user = request.user
@@ -85,7 +84,52 @@ class ConversationSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Conversation
-        fields = ["conversation_name"]
+        fields = ["id", "conversation_name"]
+
+class InboxSerializer(serializers.ModelSerializer):
+    """
+    Serializer for one inbox entry. Expects conversations from
+    ``Conversation.objects.for_inbox``.
+
+    Attributes:
+        participants (SerializerMethodField): The other participants' user data.
+        last_message (SerializerMethodField): Preview of the newest message, or None.
+        unread_count (IntegerField): Messages from others the viewer has not seen.
+        last_activity (DateTimeField): Time of the newest message.
+    """
+
+    participants = serializers.SerializerMethodField()
+    last_message = serializers.SerializerMethodField()
+    unread_count = serializers.IntegerField(read_only=True)
+    last_activity = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = [
+            "id",
+            "conversation_name",
+            "participants",
+            "last_message",
+            "unread_count",
+            "last_activity",
+        ]
+
+    def get_participants(self, obj):
+        return UserDataSerializer(obj.other_participants, context=self.context, many=True).data
+
+    def get_last_message(self, obj):
+        """
+        Returns:
+            dict or None: Sender, truncated text and time of the newest message.
+        """
+        if not obj.latest_messages:
+            return None
+        message = obj.latest_messages[0]
+        return {
+            "sender_username": message.sender.username,
+            "text": Truncator(message.text).chars(settings.MESSAGE_PREVIEW_LENGTH),
+            "created_at": serializers.DateTimeField().to_representation(message.created_at),
+        }
 
 class MessageSerializer(serializers.ModelSerializer):
     """
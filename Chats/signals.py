@@ -1,40 +1,111 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save
 from django.dispatch import receiver
-from .models import Notification, Message
+from .models import Conversation, Notification, Message
+from . import counters
+from .dispatch import (
+    chat_group,
+    conversation_seen,
+    get_outbox,
+    message_created,
+    notifications_created,
+    unread_group,
+)
 import json
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 
 
-@receiver(post_save, sender=Notification)
-def send_notification(sender, instance, created, **kwargs):
+def push_notification_counts(users):
+    """
+    Queues one badge update per user with their unseen notification count, read from
+    the counter store.
+    """
+    outbox = get_outbox()
+    counts = counters.unread_notifications([user.id for user in users])
+    for user in users:
+        data = {"count": counts[user.id]}
+        outbox.publish(user.username, {"type": "send_notification", "value": json.dumps(data)})
+
 
-    channel_layer = get_channel_layer()
-    notification_obj = Notification.objects.filter(
-        is_seen=False, user=instance.user
+def push_message_counts(conversation, user_ids):
+    """
+    Queues the unseen message counts of ``user_ids`` in a conversation, read from the
+    counter store, for the conversation's count group as ``{"counts": {user_id: n}}``.
+    """
+    counts = counters.unread_messages(conversation.id, user_ids)
+    data = {"counts": {str(user_id): count for user_id, count in counts.items()}}
+    get_outbox().publish(
+        unread_group(conversation.id),
+        {
+            "type": "send_messge_notification_count",
+            "conversation": conversation.conversation_name,
+            "conversation_id": conversation.id,
+            "value": json.dumps(data),
+        },
     )
-    notification_count = notification_obj.count()
 
-    username = instance.user.username
-    data = {"count": notification_count}
 
-    async_to_sync(channel_layer.group_send)(
-        username, {"type": "send_notification", "value": json.dumps(data)}
-    )
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            lambda: notifications_created.send(sender=Notification, users=[instance.user])
+        )
 
 
 @receiver(post_save, sender=Message)
-def send_notification(sender, instance, created, **kwargs):
-    channel_layer = get_channel_layer()
-    message_obj = Message.objects.filter(
-        is_seen=False, conversation=instance.conversation, sender=instance.sender
+def message_saved(sender, instance, created, **kwargs):
+    if not created:
+        return
+    recipient_ids = list(
+        instance.conversation.participants.exclude(pk=instance.sender_id).values_list(
+            "id", flat=True
+        )
+    )
+    transaction.on_commit(
+        lambda: message_created.send(
+            sender=Message, message=instance, recipient_ids=recipient_ids
+        )
     )
 
-    message_useen_count = message_obj.count()
 
-    data = {"message_useen_count": message_useen_count}
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def participants_saved(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Tells open chat sockets to reload the participants of changed conversations.
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        conversation_ids = pk_set or ()
+    else:
+        conversation_ids = [instance.pk]
+
+    def publish():
+        outbox = get_outbox()
+        for conversation_id in conversation_ids:
+            outbox.publish(
+                chat_group(conversation_id),
+                {"type": "participants.changed", "conversation_id": conversation_id},
+            )
+
+    transaction.on_commit(publish)
+
+
+@receiver(notifications_created)
+def count_new_notifications(sender, users, **kwargs):
+    counters.add_notifications([user.id for user in users], 1)
+    push_notification_counts(users)
+
+
+@receiver(message_created)
+def count_new_message(sender, message, recipient_ids, **kwargs):
+    counters.add_messages(message.conversation_id, recipient_ids, 1)
+    push_message_counts(message.conversation, recipient_ids)
+
 
-    async_to_sync(channel_layer.group_send)(
-        f"messages_{instance.conversation}",
-        {"type": "send_messge_notification_count", "value": json.dumps(data)},
-    )
\ No newline at end of file
+@receiver(conversation_seen)
+def count_seen_conversation(sender, conversation, user, notifications_seen, **kwargs):
+    counters.reset_messages(conversation.id, user.id)
+    counters.add_notifications([user.id], -notifications_seen)
+    push_notification_counts([user])
+    push_message_counts(conversation, [user.id])
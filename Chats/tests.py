@@ -1,3 +1,414 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from rest_framework.test import APIClient
+
+from Insta_app.asgi import application
+from Users.models import User
+from Users.views import get_tokens_for_user
+from . import counters
+from .dispatch import ThreadedOutbox
+from .models import Conversation, ConversationReadState, Message, Notification
+from .signals import push_notification_counts
+
+
+# InMemoryChannelLayer is not thread-safe, so deliver from the calling thread.
+INLINE_DELIVERY = override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    NOTIFICATION_OUTBOX="Chats.dispatch.InlineOutbox",
+)
+
+
+@INLINE_DELIVERY
+class UnreadCounterTest(TestCase):
+    """
+    Tests for the incremental unread counters.
+    """
+
+    def setUp(self):
+        counters.get_store().clear()
+        self.sender = User.objects.create(username="sender")
+        self.reader = User.objects.create(username="reader")
+        self.conversation = Conversation.objects.create(conversation_name="sender_reader")
+        self.conversation.participants.add(self.sender, self.reader)
+
+    def send(self, text="hi"):
+        with self.captureOnCommitCallbacks(execute=True):
+            message = Message.objects.create(
+                sender=self.sender, text=text, conversation=self.conversation
+            )
+            Notification.objects.create(message=message, user=self.reader)
+
+    def unread(self):
+        return (
+            counters.unread_notifications([self.reader.id])[self.reader.id],
+            counters.unread_messages(self.conversation.id, [self.reader.id])[self.reader.id],
+        )
+
+    def test_counters_follow_sends_and_mark_seen(self):
+        self.send()
+        self.assertEqual(self.unread(), (1, 1))
+        self.send()
+        self.assertEqual(self.unread(), (2, 2))
+        with self.captureOnCommitCallbacks(execute=True):
+            ConversationReadState.mark_seen(self.conversation, self.reader)
+        self.assertEqual(self.unread(), (0, 0))
+
+    def test_send_is_one_insert_plus_one_notification_batch(self):
+        self.unread()
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                message = Message.send(self.conversation, self.sender, "hi", [self.reader])
+        statements = [query["sql"].split()[0] for query in queries]
+        self.assertEqual([sql for sql in statements if sql == "INSERT"], ["INSERT", "INSERT"])
+        self.assertFalse({"SELECT", "UPDATE"} & set(statements))
+        self.assertEqual(message.notifications.get().user, self.reader)
+        self.assertEqual(self.unread(), (1, 1))
+
+    def test_badge_push_reads_counter_store(self):
+        self.send()
+        self.unread()
+        with CaptureQueriesContext(connection) as queries:
+            push_notification_counts([self.reader])
+        self.assertEqual(len(queries), 0)
+
+    def test_rebuild_fixes_drift(self):
+        self.send()
+        counters.get_store().set_many(
+            {
+                counters.notification_key(self.reader.id): 7,
+                counters.message_key(self.conversation.id, self.reader.id): 7,
+            }
+        )
+        counters.rebuild()
+        self.assertEqual(self.unread(), (1, 1))
+
+    def test_seed_keeps_counter_stored_meanwhile_and_expires(self):
+        key = counters.notification_key(self.reader.id)
+        store = counters.get_store()
+        store.set_many({key: 3})
+        self.assertEqual(counters.seed(store, {key: 0}), {key: 3})
+        store.clear()
+        self.assertEqual(counters.seed(store, {key: 2}), {key: 2})
+        store.incr_many([key], 1)
+        self.assertEqual(store.get_many([key]), {key: 3})
+        store.expires[key] = 0
+        self.assertEqual(store.get_many([key]), {})
+
+
+@INLINE_DELIVERY
+class MarkSeenTest(TestCase):
+    """
+    Tests for ConversationReadState.mark_seen.
+    """
+
+    def setUp(self):
+        counters.get_store().clear()
+        self.sender = User.objects.create(username="sender")
+        self.reader = User.objects.create(username="reader")
+
+    def conversation_with_unseen(self, count):
+        conversation = Conversation.objects.create(conversation_name=f"unseen_{count}")
+        conversation.participants.add(self.sender, self.reader)
+        for i in range(count):
+            Message.send(conversation, self.sender, str(i), [self.reader])
+        return conversation
+
+    def mark_seen(self, conversation):
+        with CaptureQueriesContext(connection) as queries:
+            seen = ConversationReadState.mark_seen(conversation, self.reader)
+        return seen, len(queries)
+
+    def test_statement_count_does_not_grow_with_unseen(self):
+        one = self.conversation_with_unseen(1)
+        many = self.conversation_with_unseen(10)
+        seen_one, queries_one = self.mark_seen(one)
+        seen_many, queries_many = self.mark_seen(many)
+        self.assertEqual((seen_one, seen_many), (1, 10))
+        self.assertEqual(queries_one, queries_many)
+
+        self.assertFalse(Message.objects.filter(conversation=many, is_seen=False).exists())
+        self.assertFalse(Notification.objects.filter(user=self.reader, is_seen=False).exists())
+        state = ConversationReadState.objects.get(conversation=many, user=self.reader)
+        last = Message.objects.filter(conversation=many).order_by("-id").first()
+        self.assertEqual(state.last_seen_message_id, last.id)
+        self.assertEqual(self.mark_seen(many)[0], 0)
+
+
+class ThreadedOutboxTest(TestCase):
+    """
+    Tests for batching and back-pressure in the notification outbox.
+    """
+
+    def setUp(self):
+        self.outbox = ThreadedOutbox()
+        # Keep messages queued instead of delivering them from the thread.
+        self.outbox.start = lambda: None
+
+    def test_newer_update_replaces_pending_one(self):
+        self.outbox.publish("reader", {"type": "send_notification", "value": "1"})
+        self.outbox.publish("other", {"type": "send_notification", "value": "5"})
+        self.outbox.publish("reader", {"type": "send_notification", "value": "2"})
+        self.assertEqual(
+            self.outbox.take_batch(),
+            [
+                ("reader", {"type": "send_notification", "value": "2"}),
+                ("other", {"type": "send_notification", "value": "5"}),
+            ],
+        )
+
+    def test_pending_counts_merge_per_user(self):
+        def counts(value):
+            return {"type": "send_messge_notification_count", "value": json.dumps(value)}
+
+        self.outbox.publish("messages_1", counts({"counts": {"2": 1}}))
+        self.outbox.publish("messages_1", counts({"counts": {"1": 1}}))
+        self.outbox.publish("messages_1", counts({"counts": {"2": 0}}))
+        [(_, message)] = self.outbox.take_batch()
+        self.assertEqual(json.loads(message["value"]), {"counts": {"1": 1, "2": 0}})
+
+    @override_settings(NOTIFICATION_OUTBOX_MAX_PENDING=2, NOTIFICATION_OUTBOX_BATCH_SIZE=1)
+    def test_full_outbox_drops_new_groups(self):
+        outbox = ThreadedOutbox()
+        outbox.start = lambda: None
+        with self.assertLogs("Chats.dispatch", "WARNING"):
+            for group in ("a", "b", "c"):
+                outbox.publish(group, {"type": "send_notification", "value": group})
+        self.assertEqual(outbox.dropped, 1)
+        self.assertEqual([group for group, _ in outbox.take_batch()], ["a"])
+        self.assertEqual([group for group, _ in outbox.take_batch()], ["b"])
+
+
+@INLINE_DELIVERY
+class StreamConsumerTest(TransactionTestCase):
+    """
+    Tests for the multiplexed stream socket.
+    """
+
+    def setUp(self):
+        counters.get_store().clear()
+
+    async def connect(self, user):
+        token = (await sync_to_async(get_tokens_for_user)(user))["access"]
+        communicator = WebsocketCommunicator(application, f"/ws/stream/?token={token}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def request(self, communicator, **frame):
+        await communicator.send_json_to(frame)
+        return await communicator.receive_json_from()
+
+    async def receive_stream(self, communicator, stream):
+        while True:
+            frame = await communicator.receive_json_from()
+            if frame["stream"] == stream:
+                return frame
+
+    async def test_streams_share_one_socket(self):
+        alice = await User.objects.acreate(username="alice")
+        bob = await User.objects.acreate(username="bob")
+        outsider = await User.objects.acreate(username="outsider")
+        conversation = await Conversation.objects.acreate(conversation_name="alice_bob")
+        await conversation.participants.aset([alice, bob])
+
+        first = await self.connect(alice)
+        history = await self.request(
+            first, action="subscribe", stream="conversation", conversation="alice_bob"
+        )
+        self.assertEqual(history["payload"]["type"], "history")
+        badge = await self.request(first, action="subscribe", stream="notifications")
+        self.assertEqual(
+            badge,
+            {
+                "stream": "notifications",
+                "conversation": None,
+                "conversation_id": None,
+                "payload": {"count": 0},
+            },
+        )
+
+        second = await self.connect(bob)
+        await self.request(
+            second, action="subscribe", stream="conversation", conversation="alice_bob"
+        )
+        await second.send_json_to(
+            {"action": "send", "conversation_id": conversation.id, "message": "hi"}
+        )
+        frame = await self.receive_stream(first, "conversation")
+        self.assertEqual(frame["conversation"], "alice_bob")
+        self.assertEqual(frame["payload"]["text"], "hi")
+
+        await first.send_json_to(
+            {"action": "unsubscribe", "stream": "conversation", "conversation": "alice_bob"}
+        )
+        await second.send_json_to(
+            {"action": "send", "conversation": "alice_bob", "message": "again"}
+        )
+        await second.receive_json_from()
+        while not await first.receive_nothing():
+            self.assertNotEqual((await first.receive_json_from())["stream"], "conversation")
+
+        third = await self.connect(outsider)
+        error = await self.request(
+            third, action="subscribe", stream="conversation", conversation="alice_bob"
+        )
+        self.assertEqual(error["payload"]["error"], "Conversation not found")
+
+        for communicator in (first, second, third):
+            await communicator.disconnect()
+
+    async def test_malformed_frames_get_errors_and_keep_socket(self):
+        alice = await User.objects.acreate(username="alice")
+        conversation = await Conversation.objects.acreate(conversation_name="alice_only")
+        await conversation.participants.aset([alice])
+        communicator = await self.connect(alice)
+
+        error = await self.request(communicator, action="subscribe", conversation_id="abc")
+        self.assertEqual(error["payload"]["error"], "Invalid conversation")
+        await self.request(communicator, action="subscribe", conversation_id=conversation.id)
+        for message in (None, "", 5):
+            error = await self.request(
+                communicator, action="send", conversation_id=conversation.id, message=message
+            )
+            self.assertEqual(error["payload"]["error"], "Invalid message")
+        self.assertFalse(await Message.objects.aexists())
+
+        frame = await self.request(
+            communicator, action="send", conversation_id=conversation.id, message="hi"
+        )
+        self.assertEqual(frame["payload"]["text"], "hi")
+        await communicator.disconnect()
+
+
+@INLINE_DELIVERY
+@override_settings(CHAT_HISTORY_PAGE_SIZE=2)
+class ChatHistoryTest(TransactionTestCase):
+    """
+    Tests for history paging on the conversation socket.
+    """
+
+    def setUp(self):
+        counters.get_store().clear()
+
+    async def test_load_before_walks_back_to_the_start(self):
+        alice = await User.objects.acreate(username="alice")
+        bob = await User.objects.acreate(username="bob")
+        conversation = await Conversation.objects.acreate(conversation_name="alice_bob")
+        await conversation.participants.aset([alice, bob])
+        for i in range(5):
+            await Message.objects.acreate(sender=bob, conversation=conversation, text=str(i))
+
+        token = (await sync_to_async(get_tokens_for_user)(alice))["access"]
+        communicator = WebsocketCommunicator(
+            application, f"/ws/conversation/{conversation.id}/?token={token}"
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        page = await communicator.receive_json_from()
+        self.assertEqual([message["text"] for message in page["messages"]], ["3", "4"])
+        texts = [message["text"] for message in page["messages"]]
+        while page["before"] is not None:
+            await communicator.send_json_to({"command": "load_before", "cursor": page["before"]})
+            page = await communicator.receive_json_from()
+            self.assertLessEqual(len(page["messages"]), 2)
+            texts = [message["text"] for message in page["messages"]] + texts
+        self.assertEqual(texts, ["0", "1", "2", "3", "4"])
+
+        await communicator.send_json_to({"command": "load_before", "cursor": "garbage"})
+        self.assertEqual(
+            await communicator.receive_json_from(), {"type": "error", "error": "Invalid cursor"}
+        )
+        await communicator.send_json_to({"command": "load_before", "cursor": None})
+        page = await communicator.receive_json_from()
+        self.assertEqual(page["type"], "history")
+        await communicator.disconnect()
+
+
+class DirectConversationTest(TestCase):
+    """
+    Tests for the direct conversation key.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username="alice")
+        self.other = User.objects.create(username="bob")
+
+    def test_pair_has_one_conversation_either_way(self):
+        conversation, created = Conversation.get_or_create_direct(self.user, self.other)
+        self.assertTrue(created)
+        self.assertEqual(
+            Conversation.get_or_create_direct(self.other, self.user), (conversation, False)
+        )
+        self.assertEqual(conversation.direct_key, f"{self.user.id}:{self.other.id}")
+
+    def test_retrieve_reuses_conversation(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        first = client.get(f"/conversation/{self.other.id}/")
+        self.assertEqual(first.status_code, 201)
+        client.force_authenticate(self.other)
+        second = client.get(f"/conversation/{self.user.id}/")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(
+            second.json()["conversation_name"], first.json()["conversation_name"]
+        )
+
+
+class InboxTest(TestCase):
+    """
+    Tests for the conversation inbox.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username="viewer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_conversation(self, name, messages_from_other=0):
+        other = User.objects.create(username=name)
+        conversation, _ = Conversation.get_or_create_direct(self.user, other)
+        for i in range(messages_from_other):
+            Message.objects.create(conversation=conversation, sender=other, text=f"{name} {i}")
+        return conversation
+
+    def inbox_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/conversation/inbox/")
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_inbox_orders_by_activity_with_preview_and_unread(self):
+        self.add_conversation("quiet")
+        busy = self.add_conversation("busy", messages_from_other=2)
+        Message.objects.create(conversation=busy, sender=self.user, text="reply")
+        entries = self.client.get("/conversation/inbox/").json()["results"]
+        self.assertEqual(
+            [(entry["conversation_name"], entry["unread_count"]) for entry in entries],
+            [("busy_viewer", 2), ("quiet_viewer", 0)],
+        )
+        self.assertEqual(entries[0]["last_message"]["text"], "reply")
+        self.assertEqual(entries[0]["participants"][0]["username"], "busy")
+        self.assertIsNone(entries[1]["last_message"])
+
+        first_page = self.client.get("/conversation/inbox/?page_size=1").json()
+        second_page = self.client.get(
+            f"/conversation/inbox/?page_size=1&cursor={first_page['next']}"
+        ).json()
+        self.assertEqual(
+            [entry["id"] for entry in first_page["results"] + second_page["results"]],
+            [entry["id"] for entry in entries],
+        )
+        self.assertIsNone(second_page["next"])
+
+    def test_inbox_query_count_does_not_grow_with_conversations(self):
+        self.add_conversation("first", messages_from_other=1)
+        baseline = self.inbox_queries()
+        for i in range(5):
+            self.add_conversation(f"other{i}", messages_from_other=2)
+        self.assertEqual(self.inbox_queries(), baseline)
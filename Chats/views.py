@@ -2,15 +2,17 @@
 Viewset for handling conversation-related operations.
 """
 
-from django.db.models import Q
+from django.db.models import Prefetch
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from core.pagination import KeysetCursorPagination
 from Posts.management.authentication import JWTAuthentication
 from Users.models import User
 
 from .models import Conversation
-from .serializers import ConversationSerializer, SendConversationSerializer
+from .serializers import ConversationSerializer, InboxSerializer, SendConversationSerializer
 
 
 class ConversationView(viewsets.ViewSet):
@@ -32,39 +34,32 @@ class ConversationView(viewsets.ViewSet):
             Response: JSON response containing serialized conversation data.
         """
         user_id = request.user.id
-        conversations = Conversation.objects.filter(participants__id=user_id)
+        conversations = Conversation.objects.filter(participants__id=user_id).prefetch_related(
+            Prefetch(
+                "participants",
+                queryset=User.objects.exclude(pk=user_id),
+                to_attr="other_participants",
+            )
+        )
         serializer = SendConversationSerializer(conversations, context={"request": request}, many=True)
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None):
         """
         Retrieves a specific conversation between the authenticated user and another user.
-        If the conversation does not exist, creates a new conversation.
+        If the conversation does not exist, creates a new conversation. The conversation
+        is found by its direct key, so it is a single indexed lookup.
 
         Returns:
             Response: JSON response containing the conversation data and status.
         """
-        sender_id = request.user.id
         try:
             receiver = User.objects.get(pk=pk)
         except User.DoesNotExist:
             return Response({"msg": "User does not exist"}, status=status.HTTP_404_NOT_FOUND)
 
-        sender_username = request.user.username
-        receiver_username = receiver.username
-
-        conv_names = [
-            f"{sender_username}_{receiver_username}",
-            f"{receiver_username}_{sender_username}"
-        ]
-
-        conversation = Conversation.objects.filter(
-            Q(conversation_name=conv_names[0]) | Q(conversation_name=conv_names[1])
-        ).first()
-
-        if not conversation:
-            conversation = Conversation.objects.create(conversation_name=conv_names[1])
-            conversation.participants.set([sender_id, receiver.id])
+        conversation, created = Conversation.get_or_create_direct(request.user, receiver)
+        if created:
             msg = "conversation created"
             status_code = status.HTTP_201_CREATED
         else:
@@ -73,3 +68,19 @@ class ConversationView(viewsets.ViewSet):
 
         serializer = ConversationSerializer(conversation)
         return Response({"msg": msg, "conversation_name": serializer.data}, status=status_code)
+
+    @action(detail=False, methods=["get"])
+    def inbox(self, request):
+        """
+        Lists the authenticated user's conversations by latest activity, each with a
+        preview of its newest message and the user's unread count. The page is built
+        from a fixed number of queries whatever its size.
+
+        Returns:
+            Response: JSON response with ``next`` cursor and a page of conversations.
+        """
+        conversations = Conversation.objects.for_inbox(request.user)
+        paginator = KeysetCursorPagination(field="last_activity")
+        page = paginator.paginate_queryset(conversations, request, view=self)
+        serializer = InboxSerializer(page, context={"request": request}, many=True)
+        return paginator.get_paginated_response(serializer.data)
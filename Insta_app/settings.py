@@ -13,9 +13,13 @@ import logging
 import os
 from pathlib import Path
 import datetime
+from dotenv import load_dotenv
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Environment overrides are read from the process environment or a local .env file.
+load_dotenv(BASE_DIR / ".env")
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
@@ -45,6 +49,7 @@ INSTALLED_APPS = [
     "Users",
     "Posts",
     "Chats",
+    "core",
     'corsheaders',
 ]
 
@@ -88,13 +93,47 @@ WSGI_APPLICATION = 'Insta_app.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# DB_ENGINE=postgres switches to PostgreSQL; SQLite stays the default for local runs.
+# DB_POOL_MODE=pgbouncer is for a transaction-pooling PgBouncer in front of Postgres:
+# server-side cursors cannot survive transaction pooling, and the pooler (not every
+# WSGI worker and Channels thread) holds the real server connections.
+
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "none")
+
+if DB_ENGINE == "postgres":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get("DB_NAME", "insta_app"),
+            'USER': os.environ.get("DB_USER", "postgres"),
+            'PASSWORD': os.environ.get("DB_PASSWORD", ""),
+            'HOST': os.environ.get("DB_HOST", "127.0.0.1"),
+            'PORT': os.environ.get("DB_PORT", "5432"),
+            'CONN_MAX_AGE': int(os.environ.get("DB_CONN_MAX_AGE", "60")),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': DB_POOL_MODE == "pgbouncer",
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get("DB_CONNECT_TIMEOUT", "5")),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get("DB_NAME", BASE_DIR / 'db.sqlite3'),
+            # Seconds a writer waits on a locked database before failing.
+            'OPTIONS': {
+                'timeout': int(os.environ.get("DB_BUSY_TIMEOUT", "20")),
+            },
+        }
     }
-}
+
+# Switch SQLite to write-ahead logging (core.signals) so readers stop blocking the
+# writer. The mode is stored in the database file itself, so it is opt-in.
+DB_SQLITE_WAL = os.environ.get("DB_SQLITE_WAL", "") == "1"
 
 
 # Password validation
@@ -133,6 +172,40 @@ USE_TZ = True
 STATIC_URL = "static/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
+
+# Media serving (core.views.serve_media). MEDIA_OFFLOAD may be "x-accel-redirect", with
+# nginx serving MEDIA_ROOT from an internal location at MEDIA_ACCEL_REDIRECT_PREFIX, or
+# "x-sendfile". Files outside the immutable blob tree are cached for MEDIA_CACHE_MAX_AGE.
+MEDIA_OFFLOAD = os.environ.get("MEDIA_OFFLOAD") or None
+MEDIA_ACCEL_REDIRECT_PREFIX = "/protected-media/"
+MEDIA_CACHE_MAX_AGE = 60 * 60
+
+# Uploads are stored once per distinct content under MEDIA_ROOT/blobs (core.storage)
+STORAGES = {
+    "default": {"BACKEND": "core.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# Bytes read per write when streaming post media to storage (Posts.media)
+MEDIA_UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# Resized copies of uploaded images (core.images), built by the job workers
+IMAGE_VARIANT_WIDTHS = (150, 320, 640, 1080)
+IMAGE_VARIANT_FORMAT = "WEBP"
+IMAGE_VARIANT_QUALITY = 80
+
+# Background job queue (core.jobs), run with `python manage.py run_jobs`. Delays are in
+# seconds; a failed job waits JOB_RETRY_DELAY, doubling per attempt up to
+# JOB_RETRY_MAX_DELAY. Running jobs untouched for JOB_LOCK_TIMEOUT are requeued.
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_RETRY_MAX_DELAY = 60 * 60
+JOB_LOCK_TIMEOUT = 15 * 60
+JOB_BATCH_SIZE = 20
+JOB_POLL_INTERVAL = 1
+JOB_RETENTION = 7 * 24 * 60 * 60
+JOB_PURGE_INTERVAL = 60 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -151,7 +224,71 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Keyset pagination (core.pagination)
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Feed timeline storage (Posts.timeline)
+TIMELINE_BACKEND = "Posts.timeline.DatabaseTimelineBackend"
+
+# Number of likers and latest comments embedded in each feed post
+LIKED_BY_SAMPLE_SIZE = 3
+LATEST_COMMENTS_SIZE = 3
+
+# Messages per history frame sent by ChatConsumer
+CHAT_HISTORY_PAGE_SIZE = 50
+
+# Characters of the newest message shown in each inbox entry
+MESSAGE_PREVIEW_LENGTH = 100
+
+# Unread counter storage (Chats.counters). Use Chats.counters.RedisCounterStore when
+# more than one process serves requests or sockets.
+UNREAD_COUNTER_BACKEND = os.environ.get(
+    "UNREAD_COUNTER_BACKEND", "Chats.counters.InMemoryCounterStore"
+)
+UNREAD_COUNTER_REDIS_URL = os.environ.get(
+    "UNREAD_COUNTER_REDIS_URL", "redis://127.0.0.1:6379/1"
+)
+# Seconds a counter seeded from the database lives before it is counted again.
+UNREAD_COUNTER_SEED_TTL = 300
+
+# Delivery of badge and unread count updates to the channel layer (Chats.dispatch).
+# ThreadedOutbox keeps at most NOTIFICATION_OUTBOX_MAX_PENDING updates waiting and
+# gives each send NOTIFICATION_OUTBOX_TIMEOUT seconds.
+NOTIFICATION_OUTBOX = "Chats.dispatch.ThreadedOutbox"
+NOTIFICATION_OUTBOX_BATCH_SIZE = 100
+NOTIFICATION_OUTBOX_MAX_PENDING = 10000
+NOTIFICATION_OUTBOX_TIMEOUT = 2
+
+
+# Verified JWTs are cached in the "auth" alias until they expire, but never longer
+# than JWT_AUTH_CACHE_MAX_TTL seconds (Posts.management.authentication). Set
+# JWT_AUTH_CACHE_REDIS_URL when more than one process serves requests: with the
+# per-process default, a logout, blacklisting or deactivation only reaches the other
+# processes once their entries expire, so the TTL is kept short there.
+JWT_AUTH_CACHE = "auth"
+JWT_AUTH_CACHE_REDIS_URL = os.environ.get("JWT_AUTH_CACHE_REDIS_URL")
+if JWT_AUTH_CACHE_REDIS_URL:
+    JWT_AUTH_CACHE_BACKEND = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": JWT_AUTH_CACHE_REDIS_URL,
+        "KEY_PREFIX": "jwt-auth",
+    }
+    JWT_AUTH_CACHE_MAX_TTL = 300
+else:
+    JWT_AUTH_CACHE_BACKEND = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "jwt-auth",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+    JWT_AUTH_CACHE_MAX_TTL = 30
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    JWT_AUTH_CACHE: JWT_AUTH_CACHE_BACKEND,
+}
 
 
 ASGI_APPLICATION = 'Insta_app.asgi.application'
@@ -165,8 +302,6 @@ CHANNEL_LAYERS = {
 }
 CORS_ALLOW_ALL_ORIGINS = True
 
-os.environ["DJANGO_ALLOW_ASYNC_UNSAFE"] = "true"
-
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': datetime.timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': datetime.timedelta(days=1),
@@ -1,10 +1,21 @@
 from rest_framework import authentication
 from rest_framework.exceptions import AuthenticationFailed, ParseError
 from django.conf import settings
+from django.core.cache import caches
+from django.db import router
 from datetime import datetime, timedelta
+import hashlib
+import time
 import jwt
 from Users.models import User
 
+# User fields kept in the cached snapshot; everything else is loaded lazily on access.
+USER_SNAPSHOT_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'email',
+    'is_active', 'is_staff', 'is_superuser', 'profile_img',
+)
+
+
 class JWTAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request):
         # Extract the JWT from the Authorization header
@@ -13,7 +24,34 @@ class JWTAuthentication(authentication.BaseAuthentication):
             return None
 
         jwt_token = self.get_the_token_from_header(jwt_token)  # clean the token
+        return self.authenticate_token(jwt_token)
+
+    @classmethod
+    def authenticate_token(cls, jwt_token):
+        """
+        Authenticates a raw token, serving verified tokens from the cache without
+        decoding or querying.
+
+        Returns:
+            tuple: ``(user, payload)``.
+        """
+        cached = cls.get_cached(jwt_token)
+        if cached is not None:
+            return cached
+
+        user, payload, expires_at = cls.verify(jwt_token)
+        cls.set_cached(jwt_token, user, payload, expires_at)
+        return (user, payload)
 
+    @classmethod
+    def verify(cls, jwt_token):
+        """
+        Decodes the token, verifies its signatures and loads the user it belongs to.
+
+        Returns:
+            tuple: ``(user, payload, expires_at)`` where ``expires_at`` is the unix time
+            the token stops being valid, or None if it never expires.
+        """
         # Decode the JWT and verify its signature
         try:
             payload = jwt.decode(jwt_token, settings.SECRET_KEY, algorithms=['HS256'])
@@ -31,8 +69,10 @@ class JWTAuthentication(authentication.BaseAuthentication):
                 raise ParseError()   
             # Extract user identifier from the nested access payload
             user_identifier = access_payload.get('id')
+            expires_at = access_payload.get('exp')
         else:
             user_identifier = payload.get('id')
+            expires_at = payload.get('exp')
         
         if user_identifier is None:
             raise AuthenticationFailed('User identifier not found in JWT')
@@ -45,8 +85,87 @@ class JWTAuthentication(authentication.BaseAuthentication):
             if user is None:
                 
                 raise AuthenticationFailed('User not found')
-        # Return the user and token payload
-        return (user, payload)
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive')
+        # Return the user, token payload and expiry
+        return (user, payload, expires_at)
+
+    @classmethod
+    def cache(cls):
+        return caches[settings.JWT_AUTH_CACHE]
+
+    @classmethod
+    def cache_key(cls, jwt_token):
+        return 'jwt:' + hashlib.sha256(jwt_token.encode()).hexdigest()
+
+    @classmethod
+    def user_version_key(cls, user_id):
+        return f'jwt-user:{user_id}'
+
+    @classmethod
+    def get_cached(cls, jwt_token):
+        """
+        Returns the cached ``(user, payload)`` for a token, or None on a miss or when the
+        user has changed since the entry was written.
+        """
+        cache = cls.cache()
+        entry = cache.get(cls.cache_key(jwt_token))
+        if entry is None:
+            return None
+        user_id = entry['user'][0]
+        if cache.get(cls.user_version_key(user_id), 0) != entry['user_version']:
+            return None
+        # Model.from_db expects values in concrete field order.
+        values = dict(zip(USER_SNAPSHOT_FIELDS, entry['user']))
+        field_names = [
+            field.attname for field in User._meta.concrete_fields if field.attname in values
+        ]
+        user = User.from_db(
+            router.db_for_read(User), field_names, [values[name] for name in field_names]
+        )
+        return (user, entry['payload'])
+
+    @classmethod
+    def set_cached(cls, jwt_token, user, payload, expires_at):
+        """
+        Caches a verified token until it expires, capped at JWT_AUTH_CACHE_MAX_TTL.
+        """
+        timeout = settings.JWT_AUTH_CACHE_MAX_TTL
+        if expires_at is not None:
+            timeout = min(timeout, int(expires_at - time.time()))
+        if timeout <= 0:
+            return
+        cache = cls.cache()
+        cache.set(
+            cls.cache_key(jwt_token),
+            {
+                'user': tuple(
+                    getattr(user, field.attname)
+                    for field in (User._meta.get_field(name) for name in USER_SNAPSHOT_FIELDS)
+                ),
+                'user_version': cache.get(cls.user_version_key(user.pk), 0),
+                'payload': payload,
+            },
+            timeout,
+        )
+
+    @classmethod
+    def invalidate_token(cls, jwt_token):
+        """
+        Drops the cached verification of a single token.
+        """
+        cls.cache().delete(cls.cache_key(jwt_token))
+
+    @classmethod
+    def invalidate_user(cls, user_id):
+        """
+        Invalidates every cached token of a user, e.g. after the user changed, was
+        deleted, or had a token blacklisted.
+        """
+        cache = cls.cache()
+        key = cls.user_version_key(user_id)
+        if not cache.add(key, 1, None):
+            cache.incr(key)
 
     def authenticate_header(self, request):
         return 'Bearer'
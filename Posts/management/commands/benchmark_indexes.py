@@ -0,0 +1,167 @@
+"""
+Management command comparing query plans of the hot query shapes with and without
+the indexes added in Posts 0009 and Chats 0005.
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Q
+
+from Chats.models import Conversation, Message, Notification
+from Posts.models import Comment, Friendship, Like, Post
+from Users.models import User
+
+# Latest migrations before the hot-path indexes were introduced.
+BEFORE_INDEXES = [
+    ("Posts", "0008_timelineentry"),
+    ("Chats", "0004_message_is_seen"),
+]
+
+
+class Command(BaseCommand):
+    """
+    Seeds a throwaway test database, then prints ``EXPLAIN`` output and mean timings
+    for each hot query shape with the indexes, and again after migrating back to the
+    schema without them. The configured database is never touched.
+
+    Usage:
+        python manage.py benchmark_indexes [--users 200] [--posts 20] [--repeat 20]
+    """
+
+    help = "Show query plans of hot queries before and after the index migrations."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--posts", type=int, default=20, help="Posts per user.")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            self.seed(options["users"], options["posts"])
+            after = self.run_queries(options["repeat"])
+            executor = MigrationExecutor(connection)
+            executor.migrate(BEFORE_INDEXES)
+            before = self.run_queries(options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for name in after:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, (plan, elapsed) in (("before", before[name]), ("after", after[name])):
+                self.stdout.write(f"  {label}: {elapsed * 1000:.3f} ms")
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+    def seed(self, user_count, posts_per_user):
+        """
+        Bulk inserts users, posts, likes, comments, friendships and chat messages.
+        """
+        rng = random.Random(0)
+        users = User.objects.bulk_create(
+            [User(username=f"bench{i}") for i in range(user_count)]
+        )
+        posts = Post.objects.bulk_create(
+            [Post(user=user, content="bench") for user in users for _ in range(posts_per_user)]
+        )
+        Like.objects.bulk_create(
+            [
+                Like(user=liker, post=post, is_like=rng.random() < 0.8)
+                for post in posts
+                for liker in rng.sample(users, min(5, len(users)))
+            ]
+        )
+        Comment.objects.bulk_create(
+            [Comment(user=rng.choice(users), post=post, content="bench") for post in posts]
+        )
+        Friendship.objects.bulk_create(
+            [
+                Friendship(
+                    from_user=user,
+                    to_user=friend,
+                    is_accepted=rng.random() < 0.7,
+                    is_follow_back_accepted=rng.random() < 0.3,
+                )
+                for user in users
+                for friend in rng.sample(users, min(10, len(users)))
+                if friend != user
+            ],
+            ignore_conflicts=True,
+        )
+        conversations = Conversation.objects.bulk_create(
+            [Conversation(conversation_name=f"bench_{i}") for i in range(user_count // 2)]
+        )
+        messages = Message.objects.bulk_create(
+            [
+                Message(
+                    conversation=conversation,
+                    sender=users[(i * 2 + j % 2) % len(users)],
+                    text="bench",
+                    is_seen=rng.random() < 0.9,
+                )
+                for i, conversation in enumerate(conversations)
+                for j in range(50)
+            ]
+        )
+        Notification.objects.bulk_create(
+            [
+                Notification(message=message, user=rng.choice(users), is_seen=message.is_seen)
+                for message in messages
+            ]
+        )
+
+    def run_queries(self, repeat):
+        """
+        Explains and times every hot query shape against the current schema.
+
+        Returns:
+            dict: ``{name: (plan, mean seconds)}``.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        # Only ids are read, so the queries stay valid on the older schema.
+        user = User.objects.order_by("id").values_list("id", flat=True).first()
+        post = Post.objects.order_by("id").values_list("id", flat=True).first()
+        conversation = (
+            Conversation.objects.order_by("id").values_list("id", flat=True).first()
+        )
+        queries = {
+            "posts by user, newest first": Post.objects.filter(user=user)
+            .order_by("-created_at")
+            .values_list("id", flat=True),
+            "likes on a post": Like.objects.filter(post=post, is_like=True).values_list(
+                "id", flat=True
+            ),
+            "like by user on a post": Like.objects.filter(user=user, post=post).values_list(
+                "id", flat=True
+            ),
+            "latest comments on a post": Comment.objects.filter(post=post)
+            .order_by("-created_at")
+            .values_list("id", flat=True)[:3],
+            "friends of a user": Friendship.objects.filter(
+                Q(from_user=user, is_accepted=True)
+                | Q(to_user=user, is_follow_back_accepted=True)
+            ).values_list("from_user", "to_user"),
+            "unseen messages in a conversation": Message.objects.filter(
+                conversation=conversation, is_seen=False
+            )
+            .exclude(sender=user)
+            .values_list("id", flat=True),
+            "unseen notifications of a user": Notification.objects.filter(
+                user=user, is_seen=False
+            ).values_list("id", flat=True),
+        }
+        results = {}
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            results[name] = (plan, (time.perf_counter() - start) / repeat)
+        return results
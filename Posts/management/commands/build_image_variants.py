@@ -0,0 +1,49 @@
+"""
+Management command to build missing or stale resized copies of uploaded images.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core import images
+from Posts.models import PostImageVideo
+from Users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Builds the variants of every post image and profile image whose recorded variants
+    do not match its current file, inline in this process.
+
+    Usage:
+        python manage.py build_image_variants
+    """
+
+    help = "Build resized variants of post and profile images."
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        sources = [
+            (PostImageVideo.objects.filter(file_type="image"), "file", "variants"),
+            (User.objects.all(), "profile_img", "profile_img_variants"),
+        ]
+        for queryset, field_name, variants_field in sources:
+            rows = (
+                queryset.exclude(**{field_name: ""})
+                .exclude(**{f"{field_name}__isnull": True})
+                .only(field_name, variants_field)
+            )
+            for row in rows.iterator():
+                if images.is_current(getattr(row, field_name), getattr(row, variants_field)):
+                    continue
+                try:
+                    images.generate(
+                        queryset.model._meta.label, row.pk, field_name, variants_field
+                    )
+                except Exception as error:
+                    self.stderr.write(f"{queryset.model.__name__} {row.pk}: {error}")
+                    failed += 1
+                else:
+                    built += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Built variants for {built} images, {failed} failed.")
+        )
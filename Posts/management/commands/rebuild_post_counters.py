@@ -0,0 +1,34 @@
+"""
+Management command to recompute the denormalized like and comment counters on posts.
+"""
+
+from django.core.management.base import BaseCommand
+
+from Posts.models import Post
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds Post.like_count and Post.comment_count from the Like and Comment tables.
+
+    Usage:
+        python manage.py rebuild_post_counters [--post <id> ...]
+    """
+
+    help = "Recompute like_count and comment_count for posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--post",
+            type=int,
+            nargs="+",
+            dest="post_ids",
+            help="Only rebuild the counters of these post ids.",
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options["post_ids"]:
+            posts = posts.filter(pk__in=options["post_ids"])
+        updated = posts.rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt counters for {updated} posts."))
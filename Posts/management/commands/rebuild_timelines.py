@@ -0,0 +1,36 @@
+"""
+Management command to rebuild the materialized feed timelines.
+"""
+
+from django.core.management.base import BaseCommand
+
+from Posts import timeline
+from Users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Recreates user timelines from the Post and Friendship tables.
+
+    Usage:
+        python manage.py rebuild_timelines [--user <id> ...]
+    """
+
+    help = "Rebuild feed timelines from posts and friendships."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            nargs="+",
+            dest="user_ids",
+            help="Only rebuild the timelines of these user ids.",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options["user_ids"] or User.objects.values_list("id", flat=True)
+        rebuilt = 0
+        for user_id in user_ids:
+            timeline.rebuild_timeline(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timelines."))
@@ -0,0 +1,121 @@
+"""
+Ingestion of post media uploads.
+
+Uploads are classified by their leading bytes rather than the client-supplied name,
+streamed to storage in ``settings.MEDIA_UPLOAD_CHUNK_SIZE`` chunks, and recorded with
+the post in one transaction, so a failed upload never leaves a half-created post or
+orphaned files behind.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from core import images, storage
+from .models import Post, PostImageVideo
+
+# (offset, signature, file_type, extension) of every accepted format.
+SIGNATURES = [
+    (0, b"\xff\xd8\xff", "image", ".jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image", ".png"),
+    (0, b"GIF87a", "image", ".gif"),
+    (0, b"GIF89a", "image", ".gif"),
+    (8, b"WEBP", "image", ".webp"),
+    (8, b"AVI ", "video", ".avi"),
+    (0, b"\x1a\x45\xdf\xa3", "video", ".webm"),
+]
+
+# ISO base media brands (bytes 8-12 after "ftyp") that are images rather than videos.
+IMAGE_BRANDS = {b"heic", b"heix", b"mif1", b"avif"}
+QUICKTIME_BRAND = b"qt  "
+
+HEADER_SIZE = 16
+
+
+class InvalidMedia(ValueError):
+    """
+    Raised when an upload is not one of the accepted image or video formats.
+    """
+
+
+def sniff(upload):
+    """
+    Classifies an upload from its first bytes, leaving its position untouched.
+
+    Returns:
+        tuple: ``(file_type, extension)``, e.g. ``("video", ".mp4")``.
+
+    Raises:
+        InvalidMedia: If the content matches no accepted format.
+    """
+    position = upload.tell()
+    upload.seek(0)
+    header = upload.read(HEADER_SIZE)
+    upload.seek(position)
+
+    if header[4:8] == b"ftyp":
+        brand = header[8:12]
+        if brand in IMAGE_BRANDS:
+            return "image", f".{brand.decode()}"
+        return "video", ".mov" if brand == QUICKTIME_BRAND else ".mp4"
+    for offset, signature, file_type, extension in SIGNATURES:
+        if header[offset : offset + len(signature)] == signature:
+            if offset == 8 and header[:4] != b"RIFF":
+                continue
+            return file_type, extension
+    raise InvalidMedia(f"{upload.name} is not a supported image or video")
+
+
+class ChunkedUpload(File):
+    """
+    Upload wrapper that makes storage read it ``MEDIA_UPLOAD_CHUNK_SIZE`` bytes at a
+    time. Uploads spooled to a temporary file are moved into place instead.
+    """
+
+    def __init__(self, upload, name):
+        super().__init__(upload, name)
+        self.DEFAULT_CHUNK_SIZE = settings.MEDIA_UPLOAD_CHUNK_SIZE
+        if hasattr(upload, "temporary_file_path"):
+            self.temporary_file_path = upload.temporary_file_path
+
+
+def create_post(user, content, uploads):
+    """
+    Creates a post with its media. Every upload is checked before anything is written;
+    the files are then streamed to storage and the post and all its media rows are
+    inserted in one transaction. Stored files nothing else references are deleted
+    again if it rolls back, and jobs building image variants are queued with it.
+
+    Returns:
+        Post: The new post.
+
+    Raises:
+        InvalidMedia: If any upload is not an accepted format. Nothing is saved.
+    """
+    kinds = [sniff(upload) for upload in uploads]
+    stored = []
+    try:
+        with transaction.atomic():
+            post = Post.objects.create(user=user, content=content)
+            media = []
+            for upload, (file_type, extension) in zip(uploads, kinds):
+                item = PostImageVideo(user=user, post=post, file_type=file_type)
+                stem = os.path.splitext(os.path.basename(upload.name))[0] or "upload"
+                item.file.save(
+                    f"{stem}{extension}", ChunkedUpload(upload, upload.name), save=False
+                )
+                stored.append(item.file.name)
+                media.append(item)
+            PostImageVideo.objects.bulk_create(media)
+            storage.acquire([item.file.name for item in media])
+            for item in media:
+                item._stored_file = item.file.name
+            images.schedule(
+                [item for item in media if item.file_type == "image"], "file", "variants"
+            )
+    except Exception:
+        storage.collect(stored)
+        raise
+    return post
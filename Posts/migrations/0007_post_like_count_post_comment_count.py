@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-17 18:49
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model('Posts', 'Post')
+    Like = apps.get_model('Posts', 'Like')
+    Comment = apps.get_model('Posts', 'Comment')
+
+    def count_of(model, **filters):
+        counts = (
+            model.objects.filter(post=OuterRef('pk'), **filters)
+            .order_by()
+            .values('post')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    Post.objects.update(
+        like_count=count_of(Like, is_like=True),
+        comment_count=count_of(Comment),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Posts', '0006_rename_is_follow_back_friendship_is_follow_back_accepted_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.6 on 2026-10-17 18:50
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_timelines(apps, schema_editor):
+    Post = apps.get_model('Posts', 'Post')
+    Friendship = apps.get_model('Posts', 'Friendship')
+    TimelineEntry = apps.get_model('Posts', 'TimelineEntry')
+
+    followers = defaultdict(set)
+    for from_user, to_user, is_accepted, is_follow_back_accepted in Friendship.objects.values_list(
+        'from_user_id', 'to_user_id', 'is_accepted', 'is_follow_back_accepted'
+    ):
+        if is_accepted:
+            followers[to_user].add(from_user)
+        if is_follow_back_accepted:
+            followers[from_user].add(to_user)
+
+    entries = [
+        TimelineEntry(owner_id=owner, post_id=post_id, created_at=created_at)
+        for post_id, author, created_at in Post.objects.values_list(
+            'id', 'user_id', 'created_at'
+        ).iterator()
+        for owner in followers[author] | {author}
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Posts', '0007_post_like_count_post_comment_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='Posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_recent_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('owner', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(populate_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.0.6 on 2026-10-17 18:53
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def delete_duplicates(model, fields, preferred_order):
+    """
+    Keeps one row per value of ``fields`` (the first by ``preferred_order``)
+    and returns the values whose duplicates were deleted.
+    """
+    duplicates = list(
+        model.objects.values(*fields).annotate(rows=Count('id')).filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        rows = model.objects.filter(**{field: duplicate[field] for field in fields})
+        keep = rows.order_by(*preferred_order).values_list('pk', flat=True)[0]
+        rows.exclude(pk=keep).delete()
+    return duplicates
+
+
+def remove_duplicate_likes_and_friendships(apps, schema_editor):
+    Like = apps.get_model('Posts', 'Like')
+    Friendship = apps.get_model('Posts', 'Friendship')
+    Post = apps.get_model('Posts', 'Post')
+
+    duplicate_likes = delete_duplicates(Like, ['user', 'post'], ['-is_like', '-id'])
+    for post_id in {duplicate['post'] for duplicate in duplicate_likes}:
+        Post.objects.filter(pk=post_id).update(
+            like_count=Like.objects.filter(post=post_id, is_like=True).count()
+        )
+    delete_duplicates(
+        Friendship,
+        ['from_user', 'to_user'],
+        ['-is_accepted', '-is_follow_back_accepted', '-is_follow_back_requested', '-id'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Posts', '0008_timelineentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes_and_friendships, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created_at'], name='comment_post_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['from_user', 'is_accepted'], name='friendship_following_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['to_user', 'is_follow_back_accepted'], name='friendship_follow_back_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(condition=models.Q(('is_like', True)), fields=['post', '-created_at'], name='like_post_liked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', '-created_at'], name='post_user_recent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.UniqueConstraint(fields=('from_user', 'to_user'), name='unique_friendship'),
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_like_per_user'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Posts', '0009_indexes_and_unique_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postimagevideo',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
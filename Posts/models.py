@@ -1,8 +1,59 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
 from Users.models import User
 from core.models import BaseModel
 
 
+class PostQuerySet(models.QuerySet):
+    """
+        QuerySet for Post with helpers for the feed read path.
+    """
+
+    def for_feed(self):
+        """
+            Loads everything PostSerializer needs up front, so serializing a page
+            of posts costs a fixed number of queries regardless of its size.
+        """
+        liked_by_sample = (
+            Like.objects.filter(is_like=True)
+            .select_related("user")
+            .order_by("-created_at", "-id")[: settings.LIKED_BY_SAMPLE_SIZE]
+        )
+        latest_comments = (
+            Comment.objects.select_related("user")
+            .order_by("-created_at", "-id")[: settings.LATEST_COMMENTS_SIZE]
+        )
+        return self.select_related("user").prefetch_related(
+            Prefetch("comments", queryset=latest_comments, to_attr="latest_comments"),
+            "postimagevideos",
+            Prefetch("likes", queryset=liked_by_sample, to_attr="liked_by_sample"),
+        )
+
+    def rebuild_counters(self):
+        """
+            Recomputes like_count and comment_count from the Like and Comment tables.
+
+            Returns:
+                int: Number of posts updated.
+        """
+        def count_of(model, **filters):
+            counts = (
+                model.objects.filter(post=OuterRef("pk"), **filters)
+                .order_by()
+                .values("post")
+                .annotate(total=Count("pk"))
+                .values("total")
+            )
+            return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+        return self.update(
+            like_count=count_of(Like, is_like=True),
+            comment_count=count_of(Comment),
+        )
+
+
 class Post(BaseModel):
     """
         Post model creating a Posts for user.
@@ -10,6 +61,15 @@ class Post(BaseModel):
     
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField(blank=True, null=True)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="post_user_recent_idx"),
+        ]
 
     def __str__(self):
         """
@@ -19,7 +79,6 @@ class Post(BaseModel):
 
 
 def upload_post_file(instance, filename):
-    print("hii",instance.user.username)
     return f"images/{instance.user.username}/Posts/{filename}"
 
 
@@ -32,6 +91,8 @@ class PostImageVideo(BaseModel):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,related_name="postimagevideos")
     file = models.FileField(upload_to=upload_post_file, blank=True, null=True)
     file_type = models.TextField(blank=True,null=True)
+    # Resized copies of image files, see core.images.
+    variants = models.JSONField(default=dict, blank=True, editable=False)
 
 class Like(BaseModel):
     """
@@ -41,6 +102,18 @@ class Like(BaseModel):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,related_name="likes")
     is_like = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "post"], name="unique_like_per_user"),
+        ]
+        indexes = [
+            models.Index(
+                fields=["post", "-created_at"],
+                condition=Q(is_like=True),
+                name="like_post_liked_idx",
+            ),
+        ]
+
 
 class Comment(BaseModel):
     """
@@ -50,6 +123,11 @@ class Comment(BaseModel):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
     content = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["post", "-created_at"], name="comment_post_recent_idx"),
+        ]
+
     def __str__(self):
         return f"{self.id}"
 
@@ -68,5 +146,54 @@ class Friendship(BaseModel):
     is_follow_back_requested = models.BooleanField(default = False)
     is_follow_back_accepted = models.BooleanField(default = False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["from_user", "to_user"], name="unique_friendship"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["from_user", "is_accepted"], name="friendship_following_idx"
+            ),
+            models.Index(
+                fields=["to_user", "is_follow_back_accepted"],
+                name="friendship_follow_back_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.from_user} follows {self.to_user}"
+
+
+class TimelineEntry(models.Model):
+    """
+        Materialized feed entry: a post that appears in the owner's timeline.
+
+        Rows are written when a post is created (fan-out on write) and when a follow is
+        accepted, so reading a feed is a range scan over the owner's entries.
+    """
+
+    owner = models.ForeignKey(
+        User, related_name="timeline_entries", on_delete=models.CASCADE
+    )
+    post = models.ForeignKey(
+        Post, related_name="timeline_entries", on_delete=models.CASCADE
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "post"], name="unique_timeline_entry"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["owner", "-created_at", "-post"],
+                name="timeline_owner_recent_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in {self.owner_id}'s timeline"
@@ -2,24 +2,52 @@
 Serializers for converting Django model instances to JSON format.
 """
 
+from django.conf import settings
 from rest_framework import serializers
 from Users.models import User
 from .models import Post, PostImageVideo, Like, Comment, Friendship
 from urllib.parse import urljoin
 from django.db.models import Q
+from core import images
 
 
 class PostImageVideoSerializer(serializers.ModelSerializer):
     """
     Serializer for handling PostImageVideo model instances.
+
+    ``file`` is the variant matching the request's ``image_size`` when one exists.
     """
 
     file = serializers.FileField(max_length=None, use_url=True)
+    variants = serializers.SerializerMethodField()
 
     class Meta:
         model = PostImageVideo
         fields = "__all__"
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        request = self.context.get("request")
+        if instance.file and request:
+            data["file"] = images.image_url(instance.file, instance.variants, request)
+        return data
+
+    def get_variants(self, obj):
+        """
+        Method to get the URLs of the resized copies of an image.
+
+        Returns:
+            dict: Variant URLs keyed by width.
+        """
+        request = self.context.get("request")
+        if not request or not images.is_current(obj.file, obj.variants):
+            return {}
+        base = request.build_absolute_uri("/")
+        return {
+            width: urljoin(base, obj.file.storage.url(name))
+            for width, name in obj.variants["sizes"].items()
+        }
+
 
 class CommentSerializer(serializers.ModelSerializer):
     """
@@ -36,32 +64,76 @@ class CommentSerializer(serializers.ModelSerializer):
         return obj.user.username
 
 
-class LikeSerializer(serializers.ModelSerializer):
+class LikerSerializer(serializers.ModelSerializer):
     """
-    Serializer for handling Like model instances.
+    Serializer for listing the users who liked a post.
     """
 
+    user_id = serializers.IntegerField(source="user.id", read_only=True)
+    username = serializers.CharField(source="user.username", read_only=True)
+    profile_img = serializers.SerializerMethodField()
+
     class Meta:
         model = Like
-        fields = "__all__"
+        fields = ("user_id", "username", "profile_img")
+
+    def get_profile_img(self, obj):
+        """
+        Method to get the profile image URL of the user who liked the post.
+
+        Returns:
+            str or None: The profile image URL if available, otherwise None.
+        """
+        request = self.context.get("request")
+        return images.image_url(obj.user.profile_img, obj.user.profile_img_variants, request)
+
+
+class PostListSerializer(serializers.ListSerializer):
+    """
+    List serializer for posts that looks up the viewer's likes for the whole page at once.
+    """
+
+    def to_representation(self, data):
+        """
+        Method to serialize a list of posts.
+
+        The like state of every post on the page is fetched in a single query and shared
+        with the child serializer through the ``like_states`` context entry.
+
+        Returns:
+            list: Serialized data of the posts.
+        """
+        posts = list(data.all() if hasattr(data, "all") else data)
+        user = self.context.get("user")
+        if user is not None:
+            self.context["like_states"] = dict(
+                Like.objects.filter(user=user, post__in=posts).values_list(
+                    "post_id", "is_like"
+                )
+            )
+        return super().to_representation(posts)
 
 
 class PostSerializer(serializers.ModelSerializer):
     """
     Serializer for handling Post model instances including related comments, images/videos, and likes.
+
+    Querysets should come from ``Post.objects.for_feed()`` to avoid per-post queries.
     """
 
-    comments = CommentSerializer(many=True, read_only=True)
+    comments = serializers.SerializerMethodField()
     post_images_videos = PostImageVideoSerializer(
         source="postimagevideos", read_only=True, many=True
     )
     user_name = serializers.SerializerMethodField()
-    total_likes = serializers.SerializerMethodField()
+    total_likes = serializers.IntegerField(source="like_count", read_only=True)
+    total_comments = serializers.IntegerField(source="comment_count", read_only=True)
     has_like = serializers.SerializerMethodField()
-    all_likes = LikeSerializer(source="likes", read_only=True, many=True)
+    liked_by = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
+        list_serializer_class = PostListSerializer
         fields = (
             "id",
             "user_name",
@@ -69,27 +141,55 @@ class PostSerializer(serializers.ModelSerializer):
             "comments",
             "post_images_videos",
             "has_like",
-            "all_likes",
+            "liked_by",
             "total_likes",
+            "total_comments",
         )
 
-    def get_total_likes(self, obj):
+    def get_user_name(self, obj):
         """
-        Method to get the total number of likes on a post.
+        Method to get the username of the post owner.
 
         Returns:
-            int: The total number of likes on the post.
+            str: The username of the post owner.
         """
-        return Like.objects.filter(post=obj, is_like=True).count()
+        return obj.user.username
 
-    def get_user_name(self, obj):
+    def get_comments(self, obj):
         """
-        Method to get the username of the post owner.
+        Method to get the latest comments on the post, oldest first.
+
+        Older comments are served page by page from ``addcommentpost/<post id>/``.
 
         Returns:
-            str: The username of the post owner.
+            list: Serialized data of the latest comments.
         """
-        return obj.user.username
+        comments = getattr(obj, "latest_comments", None)
+        if comments is None:
+            comments = (
+                Comment.objects.filter(post=obj)
+                .select_related("user")
+                .order_by("-created_at", "-id")[: settings.LATEST_COMMENTS_SIZE]
+            )
+        return CommentSerializer(reversed(list(comments)), many=True).data
+
+    def get_liked_by(self, obj):
+        """
+        Method to get a small sample of the users who liked the post.
+
+        The full list is served page by page from ``likepost/<id>/likers/``.
+
+        Returns:
+            list: Usernames of the most recent likers.
+        """
+        likes = getattr(obj, "liked_by_sample", None)
+        if likes is None:
+            likes = (
+                Like.objects.filter(post=obj, is_like=True)
+                .select_related("user")
+                .order_by("-created_at", "-id")[: settings.LIKED_BY_SAMPLE_SIZE]
+            )
+        return [like.user.username for like in likes]
 
     def get_has_like(self, obj):
         """
@@ -98,6 +198,9 @@ class PostSerializer(serializers.ModelSerializer):
         Returns:
             bool or None: True if the authenticated user has liked the post, False otherwise. None if not authenticated.
         """
+        like_states = self.context.get("like_states")
+        if like_states is not None:
+            return like_states.get(obj.id)
         like = Like.objects.filter(user=self.context["user"], post=obj).first()
         if like:
             return like.is_like
@@ -189,16 +292,13 @@ class UsernameSerializer(serializers.ModelSerializer):
 
     def get_profile_img(self, obj):
         """
-        Method to get the profile image URL of the user sending the friendship request.
+        Method to get the profile image URL of the user, sized by ``image_size``.
 
         Returns:
-            str or None: The profile image URL of the user sending the request if available, otherwise None.
+            str or None: The profile image URL of the user if available, otherwise None.
         """
         request = self.context.get("request")
-        profile_image = obj.profile_img
-        if profile_image and request:
-            return urljoin(request.build_absolute_uri("/"), profile_image.url)
-        return None
+        return images.image_url(obj.profile_img, obj.profile_img_variants, request)
 
 
 class FriendsListSerializer(serializers.ModelSerializer):
@@ -0,0 +1,43 @@
+"""
+Signal receivers keeping media blob references in sync with post media rows.
+"""
+
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from core import storage
+from .models import PostImageVideo
+
+
+@receiver(post_init, sender=PostImageVideo)
+def remember_media_file(sender, instance, **kwargs):
+    """
+    Notes the file media was loaded with, so saving can tell whether it changed. Left
+    unset when the field was deferred.
+    """
+    if "file" not in instance.__dict__:
+        instance._stored_file = None
+        return
+    value = instance.__dict__["file"]
+    instance._stored_file = getattr(value, "name", value) or ""
+
+
+@receiver(post_save, sender=PostImageVideo)
+def media_saved(sender, instance, created, **kwargs):
+    """
+    Moves the blob reference from the previous file of the media to the new one. Rows
+    inserted with bulk_create are referenced by their creator (see ``Posts.media``).
+    """
+    previous = "" if created else getattr(instance, "_stored_file", None)
+    current = instance.file.name or ""
+    if previous is None or previous == current:
+        return
+    storage.acquire([current])
+    storage.release([previous])
+    instance._stored_file = current
+
+
+@receiver(post_delete, sender=PostImageVideo)
+def media_deleted(sender, instance, **kwargs):
+    if instance.file:
+        storage.release([instance.file.name])
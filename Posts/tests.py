@@ -1,3 +1,370 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from Users.models import User
+from Users.views import get_tokens_for_user
+from .management.authentication import JWTAuthentication
+from core import jobs, storage
+from core.models import Blob
+from .models import Comment, Friendship, Like, Post, PostImageVideo
+
+
+class FeedQueryCountTest(TestCase):
+    """
+    Regression tests for the number of queries issued by the post feed.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username="viewer")
+        self.friend = User.objects.create(username="friend")
+        Friendship.objects.create(
+            from_user=self.user, to_user=self.friend, is_accepted=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_posts(self, count):
+        """
+        Creates posts for the friend, each with media, comments and likes.
+        """
+        for i in range(count):
+            post = Post.objects.create(user=self.friend, content=f"post {i}")
+            PostImageVideo.objects.create(
+                user=self.friend, post=post, file=f"images/friend/Posts/{i}.jpg"
+            )
+            Comment.objects.create(user=self.user, post=post, content="nice")
+            Comment.objects.create(user=self.friend, post=post, content="thanks")
+            Like.objects.create(user=self.user, post=post, is_like=True)
+            Like.objects.create(user=self.friend, post=post, is_like=False)
+        call_command("rebuild_post_counters", stdout=StringIO())
+        call_command("rebuild_timelines", stdout=StringIO())
+
+    def count_feed_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feed_query_count_does_not_grow_with_posts(self):
+        self.create_posts(3)
+        small_feed = self.count_feed_queries("/userpost/")
+        self.create_posts(20)
+        large_feed = self.count_feed_queries("/userpost/")
+        self.assertEqual(small_feed, large_feed)
+
+    def test_profile_query_count_does_not_grow_with_posts(self):
+        self.create_posts(3)
+        small_profile = self.count_feed_queries(f"/userpost/{self.friend.id}/")
+        self.create_posts(20)
+        large_profile = self.count_feed_queries(f"/userpost/{self.friend.id}/")
+        self.assertEqual(small_profile, large_profile)
+
+    def test_feed_reports_likes(self):
+        self.create_posts(2)
+        response = self.client.get("/userpost/")
+        self.assertEqual(len(response.json()), 2)
+        for post in response.json():
+            self.assertEqual(post["total_likes"], 1)
+            self.assertTrue(post["has_like"])
+            self.assertEqual(post["liked_by"], ["viewer"])
+            self.assertEqual(
+                [comment["content"] for comment in post["comments"]], ["nice", "thanks"]
+            )
+
+    def test_feed_pages_follow_the_cursor(self):
+        for i in range(5):
+            Post.objects.create(user=self.friend, content=f"post {i}")
+        call_command("rebuild_timelines", stdout=StringIO())
+
+        contents = []
+        url = "/userpost/?page_size=2"
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page["results"]), 2)
+            contents += [post["content"] for post in page["results"]]
+            url = page["next"] and f"/userpost/?page_size=2&cursor={page['next']}"
+        self.assertEqual(contents, [f"post {i}" for i in reversed(range(5))])
+        self.assertIsNone(page["next"])
+        self.assertEqual(self.client.get("/userpost/?cursor=garbage").status_code, 404)
+
+    def test_likers_pages_current_likes_newest_first(self):
+        post = Post.objects.create(user=self.friend, content="liked")
+        likers = [User.objects.create(username=f"liker{i}") for i in range(3)]
+        for liker in likers:
+            Like.objects.create(user=liker, post=post, is_like=True)
+        Like.objects.create(
+            user=User.objects.create(username="unliked"), post=post, is_like=False
+        )
+
+        usernames = []
+        url = f"/likepost/{post.id}/likers/?page_size=2"
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page["results"]), 2)
+            usernames += [liker["username"] for liker in page["results"]]
+            url = page["next"] and f"/likepost/{post.id}/likers/?page_size=2&cursor={page['next']}"
+        self.assertEqual(usernames, ["liker2", "liker1", "liker0"])
+
+
+class PostCounterTest(TestCase):
+    """
+    Tests for the denormalized like and comment counters on Post.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username="viewer")
+        self.post = Post.objects.create(user=self.user, content="post")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_like_toggle_updates_like_count(self):
+        self.client.get(f"/likepost/{self.post.id}/")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.client.get(f"/likepost/{self.post.id}/")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_unlike_on_drifted_count_stays_at_zero(self):
+        self.client.get(f"/likepost/{self.post.id}/")
+        Post.objects.filter(pk=self.post.pk).update(like_count=0)
+        response = self.client.get(f"/likepost/{self.post.id}/")
+        self.assertLess(response.status_code, 500)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_comment_updates_comment_count(self):
+        self.client.post(
+            "/addcommentpost/", {"post_id": self.post.id, "comment": "first"}
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_comments_page_newest_first(self):
+        for i in range(3):
+            Comment.objects.create(user=self.user, post=self.post, content=f"comment {i}")
+        first = self.client.get(f"/addcommentpost/{self.post.id}/?page_size=2").json()
+        self.assertEqual(
+            [comment["content"] for comment in first["results"]], ["comment 2", "comment 1"]
+        )
+        second = self.client.get(
+            f"/addcommentpost/{self.post.id}/?page_size=2&cursor={first['next']}"
+        ).json()
+        self.assertEqual([comment["content"] for comment in second["results"]], ["comment 0"])
+        self.assertIsNone(second["next"])
+
+    def test_rebuild_fixes_drift(self):
+        Like.objects.create(user=self.user, post=self.post, is_like=True)
+        Comment.objects.create(user=self.user, post=self.post, content="drift")
+        call_command("rebuild_post_counters", stdout=StringIO())
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+
+class TimelineTest(TestCase):
+    """
+    Tests for the fan-out-on-write feed timelines.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username="viewer")
+        self.friend = User.objects.create(username="friend")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.friend_client = APIClient()
+        self.friend_client.force_authenticate(self.friend)
+
+    def feed_contents(self):
+        return [post["content"] for post in self.client.get("/userpost/").json()]
+
+    def create_post(self, client, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post("/userpost/", {"content": content})
+
+    def test_accept_backfills_and_unfollow_prunes(self):
+        self.create_post(self.friend_client, "before")
+        self.client.post(f"/friendship/{self.friend.id}/send_request/")
+        self.assertEqual(self.feed_contents(), [])
+
+        self.friend_client.post(
+            f"/friendship/{self.user.id}/handle_request/", {"action": "accept"}
+        )
+        self.create_post(self.friend_client, "after")
+        self.assertEqual(self.feed_contents(), ["after", "before"])
+
+        self.client.post(
+            f"/friendship/{self.friend.id}/handle_request/", {"action": "unfollow"}
+        )
+        self.assertEqual(self.feed_contents(), [])
+
+    def test_deleted_post_leaves_feed(self):
+        self.create_post(self.client, "mine")
+        self.assertEqual(self.feed_contents(), ["mine"])
+        post = Post.objects.get()
+        self.client.delete(f"/userpost/{post.id}/")
+        self.assertEqual(self.feed_contents(), [])
+
+
+class JWTAuthenticationCacheTest(TestCase):
+    """
+    Tests for the verified-token cache in JWTAuthentication.
+    """
+
+    def setUp(self):
+        caches[settings.JWT_AUTH_CACHE].clear()
+        self.user = User.objects.create(username="viewer")
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(self.user)['access']}"
+        )
+
+    def count_user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/userpost/")
+        self.assertEqual(response.status_code, 200)
+        return sum('"Users_user"' in query["sql"] for query in queries)
+
+    def test_cached_token_skips_user_lookup(self):
+        self.assertGreater(self.count_user_queries(), 0)
+        self.assertEqual(self.count_user_queries(), 0)
+
+    def test_user_change_invalidates_cached_token(self):
+        self.count_user_queries()
+        self.user.save()
+        self.assertGreater(self.count_user_queries(), 0)
+        self.assertEqual(self.count_user_queries(), 0)
+
+    def test_cached_user_keeps_its_fields(self):
+        token = get_tokens_for_user(self.user)["access"]
+        JWTAuthentication.set_cached(token, *JWTAuthentication.verify(token))
+        user, payload = JWTAuthentication.get_cached(token)
+        self.assertEqual(
+            (user.pk, user.username, user.is_active, user.is_superuser),
+            (self.user.pk, "viewer", True, False),
+        )
+
+
+class MediaUploadTest(TestCase):
+    """
+    Tests for the post media upload pipeline.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create(username="author")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, *files):
+        return self.client.post(
+            "/userpost/", {"content": "hello", "files": list(files)}, format="multipart"
+        )
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.media_root) for name in names]
+
+    def test_types_come_from_content_not_name(self):
+        image = SimpleUploadedFile("clip.mp4", b"\x89PNG\r\n\x1a\n" + b"\0" * 32)
+        video = SimpleUploadedFile("photo.jpg", b"\0\0\0\x18ftypisom" + b"\0" * 32)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(image, video)
+        self.assertEqual(response.status_code, 201)
+        media = PostImageVideo.objects.order_by("id")
+        self.assertEqual(
+            [(item.file_type, os.path.splitext(item.file.name)[1]) for item in media],
+            [("image", ".png"), ("video", ".mp4")],
+        )
+        self.assertEqual(
+            sum('INSERT INTO "Posts_postimagevideo"' in query["sql"] for query in queries), 1
+        )
+
+    def test_invalid_file_rejects_whole_post(self):
+        image = SimpleUploadedFile("photo.png", b"\x89PNG\r\n\x1a\n" + b"\0" * 32)
+        script = SimpleUploadedFile("photo.jpg", b"#!/bin/sh\necho nope\n")
+        response = self.upload(image, script)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("photo.jpg", response.json()["files"][0])
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_requested_size_serves_smallest_wide_enough_variant(self):
+        buffer = BytesIO()
+        Image.new("RGB", (800, 600), "red").save(buffer, "PNG")
+        photo = SimpleUploadedFile("photo.png", buffer.getvalue())
+        self.assertEqual(self.upload(photo).status_code, 201)
+        jobs.run_pending()
+
+        item = PostImageVideo.objects.get()
+        self.assertEqual(sorted(item.variants["sizes"], key=int), ["150", "320", "640"])
+        with item.file.storage.open(item.variants["sizes"]["320"]) as variant:
+            self.assertEqual(Image.open(variant).size, (320, 240))
+
+        def served(query=""):
+            response = self.client.get(f"/userpost/{self.user.id}/{query}")
+            return response.json()["posts"][0]["post_images_videos"][0]["file"]
+
+        self.assertTrue(served().endswith(".png"))
+        self.assertTrue(served("?image_size=300").endswith("_320.webp"))
+        self.assertTrue(served("?image_size=2000").endswith(".png"))
+
+    def test_duplicate_uploads_share_one_blob_until_last_delete(self):
+        buffer = BytesIO()
+        Image.new("RGB", (200, 100), "blue").save(buffer, "PNG")
+        content = buffer.getvalue()
+        for name in ("first.png", "second.png"):
+            self.upload(SimpleUploadedFile(name, content))
+        first, second = PostImageVideo.objects.order_by("id")
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(Blob.objects.get(name=first.file.name).references, 2)
+        jobs.run_pending()
+        self.assertEqual(len(self.stored_files()), 2)
+
+        self.client.delete(f"/userpost/{first.post_id}/")
+        jobs.run_pending()
+        self.assertEqual(len(self.stored_files()), 2)
+        self.client.delete(f"/userpost/{second.post_id}/")
+        jobs.run_pending()
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(Blob.objects.exists())
+
+    def test_changing_file_moves_reference(self):
+        for name, color in (("first.png", "red"), ("second.png", "green")):
+            buffer = BytesIO()
+            Image.new("RGB", (10, 10), color).save(buffer, "PNG")
+            self.upload(SimpleUploadedFile(name, buffer.getvalue()))
+        first, second = PostImageVideo.objects.order_by("id")
+        old_name = first.file.name
+        first.file = second.file.name
+        first.save()
+        self.assertEqual(Blob.objects.get(name=second.file.name).references, 2)
+        self.assertEqual(Blob.objects.get(name=old_name).references, 0)
+        jobs.run_pending()
+        self.assertFalse(first.file.storage.exists(old_name))
+        self.assertTrue(first.file.storage.exists(second.file.name))
+
+    def test_collect_keeps_file_referenced_meanwhile(self):
+        buffer = BytesIO()
+        Image.new("RGB", (10, 10), "blue").save(buffer, "PNG")
+        self.upload(SimpleUploadedFile("photo.png", buffer.getvalue()))
+        item = PostImageVideo.objects.get()
+        Blob.objects.filter(name=item.file.name).update(references=0)
+        storage.acquire([item.file.name])
+        self.assertEqual(storage.collect([item.file.name]), 0)
+        self.assertTrue(item.file.storage.exists(item.file.name))
@@ -0,0 +1,241 @@
+"""
+Fan-out-on-write timelines for the home feed.
+
+Every user owns a timeline holding the ids of their own posts and the posts of the
+users they follow. New posts are pushed to the timelines of the author's followers,
+and accepting or dropping a follow backfills or prunes the follower's timeline, so
+reading a feed never has to look at Friendship.
+
+The storage is pluggable through ``settings.TIMELINE_BACKEND``.
+"""
+
+import threading
+
+from django.db.models import Q
+
+from core.backends import backend_loader
+from core.pagination import decode_cursor, encode_cursor, keyset_page
+from .models import Friendship, Post, TimelineEntry
+
+
+class BaseTimelineBackend:
+    """
+    Interface for timeline storage. Timelines are ordered newest first by
+    ``(post created_at, post id)``.
+    """
+
+    def add(self, owner_ids, posts):
+        """
+        Adds ``posts`` to the timelines of every user in ``owner_ids``.
+        """
+        raise NotImplementedError
+
+    def remove(self, owner_id, post_ids):
+        """
+        Removes ``post_ids`` from the timeline of ``owner_id``.
+        """
+        raise NotImplementedError
+
+    def discard(self, post_ids):
+        """
+        Removes ``post_ids`` from every timeline.
+        """
+        raise NotImplementedError
+
+    def clear(self, owner_id):
+        """
+        Empties the timeline of ``owner_id``.
+        """
+        raise NotImplementedError
+
+    def page(self, owner_id, cursor=None, page_size=None):
+        """
+        Returns one page of the timeline of ``owner_id``.
+
+        Returns:
+            tuple: ``(post_ids, next_cursor)``.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        raise NotImplementedError
+
+
+class DatabaseTimelineBackend(BaseTimelineBackend):
+    """
+    Stores timelines in the TimelineEntry table.
+    """
+
+    def add(self, owner_ids, posts):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(owner_id=owner_id, post_id=post.id, created_at=post.created_at)
+                for owner_id in owner_ids
+                for post in posts
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+    def remove(self, owner_id, post_ids):
+        TimelineEntry.objects.filter(owner_id=owner_id, post_id__in=post_ids).delete()
+
+    def discard(self, post_ids):
+        TimelineEntry.objects.filter(post_id__in=post_ids).delete()
+
+    def clear(self, owner_id):
+        TimelineEntry.objects.filter(owner_id=owner_id).delete()
+
+    def page(self, owner_id, cursor=None, page_size=None):
+        entries, next_cursor = keyset_page(
+            TimelineEntry.objects.filter(owner_id=owner_id).only("created_at", "post_id"),
+            cursor,
+            page_size,
+            tiebreaker="post_id",
+        )
+        return [entry.post_id for entry in entries], next_cursor
+
+
+class InMemoryTimelineBackend(BaseTimelineBackend):
+    """
+    Keeps timelines in process memory, lost on restart and not shared between
+    processes. Fan-out from another process never reaches it, so every process that
+    writes posts must also serve the feeds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timelines = {}
+
+    def add(self, owner_ids, posts):
+        with self.lock:
+            for owner_id in owner_ids:
+                timeline = self.timelines.setdefault(owner_id, {})
+                for post in posts:
+                    timeline[post.id] = post.created_at
+
+    def remove(self, owner_id, post_ids):
+        with self.lock:
+            timeline = self.timelines.get(owner_id, {})
+            for post_id in post_ids:
+                timeline.pop(post_id, None)
+
+    def discard(self, post_ids):
+        with self.lock:
+            for timeline in self.timelines.values():
+                for post_id in post_ids:
+                    timeline.pop(post_id, None)
+
+    def clear(self, owner_id):
+        with self.lock:
+            self.timelines.pop(owner_id, None)
+
+    def page(self, owner_id, cursor=None, page_size=None):
+        with self.lock:
+            entries = sorted(
+                ((created_at, post_id) for post_id, created_at in self.timelines.get(owner_id, {}).items()),
+                reverse=True,
+            )
+        if cursor:
+            position = decode_cursor(cursor)
+            entries = [entry for entry in entries if entry < position]
+        if page_size is None or len(entries) <= page_size:
+            return [post_id for _, post_id in entries], None
+        entries = entries[:page_size]
+        return [post_id for _, post_id in entries], encode_cursor(*entries[-1])
+
+
+get_backend = backend_loader("TIMELINE_BACKEND")
+
+
+def follower_ids(user_id):
+    """
+    Returns the ids of users whose feed includes posts by ``user_id``.
+    """
+    pairs = Friendship.objects.filter(
+        Q(to_user=user_id, is_accepted=True)
+        | Q(from_user=user_id, is_follow_back_accepted=True)
+    ).values_list("from_user", "to_user")
+    return {
+        other_id for pair in pairs for other_id in pair if other_id != user_id
+    }
+
+
+def follow_edges(friendship):
+    """
+    Returns the ``(follower_id, followee_id)`` pairs implied by a friendship row.
+    """
+    edges = set()
+    if friendship is None:
+        return edges
+    if friendship.is_accepted:
+        edges.add((friendship.from_user_id, friendship.to_user_id))
+    if friendship.is_follow_back_accepted:
+        edges.add((friendship.to_user_id, friendship.from_user_id))
+    return edges
+
+
+def fan_out_post(post):
+    """
+    Pushes a new post to its author's timeline and to the timelines of their followers.
+    """
+    get_backend().add({post.user_id} | follower_ids(post.user_id), [post])
+
+
+def discard_posts(post_ids):
+    """
+    Removes deleted posts from every timeline.
+    """
+    get_backend().discard(list(post_ids))
+
+
+def sync_follow_edges(before, after):
+    """
+    Backfills timelines for follows that were added and prunes those that were dropped.
+
+    Args:
+        before (set): Follow edges before the change, as returned by ``follow_edges``.
+        after (set): Follow edges after the change.
+    """
+    backend = get_backend()
+    for follower_id, followee_id in after - before:
+        backend.add(
+            [follower_id],
+            list(Post.objects.filter(user=followee_id).only("id", "created_at")),
+        )
+    for follower_id, followee_id in before - after:
+        backend.remove(
+            follower_id,
+            list(Post.objects.filter(user=followee_id).values_list("id", flat=True)),
+        )
+
+
+def rebuild_timeline(user_id):
+    """
+    Recreates the timeline of ``user_id`` from Post and Friendship.
+    """
+    backend = get_backend()
+    backend.clear(user_id)
+    friendships = Friendship.objects.filter(Q(from_user=user_id) | Q(to_user=user_id))
+    followee_ids = {
+        followee_id
+        for friendship in friendships
+        for follower_id, followee_id in follow_edges(friendship)
+        if follower_id == user_id
+    }
+    backend.add(
+        [user_id],
+        list(
+            Post.objects.filter(user__in=followee_ids | {user_id}).only("id", "created_at")
+        ),
+    )
+
+
+def load_posts(queryset, post_ids):
+    """
+    Fetches the posts behind a timeline page, keeping the timeline order.
+
+    Posts deleted since the page was read are skipped.
+    """
+    posts = queryset.in_bulk(post_ids)
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
@@ -3,22 +3,27 @@ Views for handling API endpoints related to posts, comments, likes, friendships,
 """
 
 import json
-import os
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from core.pagination import KeysetCursorPagination
+from . import media, timeline
 from .management.authentication import JWTAuthentication
 from .models import *
 from .serializers import (
     AddPostSerializer,
     CommentSerializer,
     FriendshipRequestSerializer,
-    PostImageVideoSerializer,
     PostSerializer,
     UsernameSerializer,
     FriendsListSerializer,
+    LikerSerializer,
 )
 
 
@@ -33,32 +38,23 @@ class UserPostView(viewsets.ViewSet):
         """
         Handles POST request to create a new post with optional images/videos.
 
+        The post and its media are saved together or not at all (see ``Posts.media``);
+        a file that is not a supported image or video rejects the whole request.
+
         Returns:
             Response: JSON response indicating success or failure of post creation.
         """
-        user = request.user.id
         files = request.FILES.getlist("files")
-        data = {"user": user, "content": request.data["content"]}
+        data = {"user": request.user.id, "content": request.data["content"]}
         add_post_serializer = AddPostSerializer(data=data)
         if add_post_serializer.is_valid():
-            post = add_post_serializer.save()
-            if files:
-                for file in files:
-                    file_extension = os.path.splitext(file.name)[1].lower()
-                    if file_extension in [".mp4", ".mov", ".avi"]:
-                        file_type = "video"
-                    else:
-                        file_type = "image"
-
-                    image_data = {
-                        "user": user,
-                        "file": file,
-                        "post": post.id,
-                        "file_type": file_type,
-                    }
-                    image_serializer = PostImageVideoSerializer(data=image_data)
-                    if image_serializer.is_valid():
-                        image_serializer.save()
+            try:
+                post = media.create_post(
+                    request.user, add_post_serializer.validated_data["content"], files
+                )
+            except media.InvalidMedia as error:
+                return Response({"files": [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+            transaction.on_commit(lambda: timeline.fan_out_post(post))
             return Response({"msg": "Post Created"}, status=status.HTTP_201_CREATED)
         return Response(add_post_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -66,29 +62,34 @@ class UserPostView(viewsets.ViewSet):
         """
         Handles GET request to list posts of the authenticated user and their friends.
 
+        Passing ``cursor`` or ``page_size`` switches to the paginated feed mode, which
+        returns ``{"next": <cursor>, "results": [...]}`` one page at a time.
+
+        Posts are read from the user's materialized timeline (see ``Posts.timeline``).
+
         Returns:
             Response: JSON response with list of posts and associated data.
         """
         context = {"request": request, "user": request.user}
-        user = request.user
-
-        friends_ids = Friendship.objects.filter(
-            Q(from_user=user, is_accepted=True)
-            | Q(to_user=user, is_follow_back_accepted=True)
-        ).values_list("from_user", "to_user")
-
-        friends_ids = set(
-            friend_id
-            for friend_pair in friends_ids
-            for friend_id in friend_pair
-            if friend_id != user.id
+        paginator = KeysetCursorPagination()
+        paginated = bool(
+            {paginator.cursor_query_param, paginator.page_size_query_param}
+            & set(request.query_params)
         )
 
-        posts = Post.objects.filter(
-            Q(user=user) | Q(user__id__in=friends_ids)
-        ).order_by("-created_at")
+        try:
+            post_ids, paginator.next_cursor = timeline.get_backend().page(
+                request.user.id,
+                request.query_params.get(paginator.cursor_query_param),
+                paginator.get_page_size(request) if paginated else None,
+            )
+        except ValueError:
+            raise NotFound("Invalid cursor")
+        posts = timeline.load_posts(Post.objects.for_feed(), post_ids)
 
         post_serializer = PostSerializer(posts, context=context, many=True)
+        if paginated:
+            return paginator.get_paginated_response(post_serializer.data)
         return Response(post_serializer.data, status=status.HTTP_200_OK)
 
     def retrieve(self, request, pk=None):
@@ -100,7 +101,7 @@ class UserPostView(viewsets.ViewSet):
         """
         context = {"request": request, "user": request.user}
         user = User.objects.get(pk=pk)
-        queryset = Post.objects.filter(user=user).order_by("-created_at")
+        queryset = Post.objects.for_feed().filter(user=user).order_by("-created_at")
         total_post = queryset.count()
         total_friends = Friendship.objects.filter(
             Q(from_user=user, is_accepted=True)
@@ -127,7 +128,9 @@ class UserPostView(viewsets.ViewSet):
         """
         post = Post.objects.filter(pk=pk, user=request.user.id)
         if post:
+            post_ids = [p.id for p in post]
             post.delete()
+            timeline.discard_posts(post_ids)
             return Response({"msg": "Post Deleted"}, status=status.HTTP_201_CREATED)
         return Response({"msg": "Post Not Found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -156,17 +159,48 @@ class LikePostView(viewsets.ViewSet):
         like, created = Like.objects.get_or_create(post=post, user=request.user)
 
         if created or not like.is_like:
-            like.is_like = True
-            like.save()
+            self.toggle_like(like, is_like=True)
             return Response(
                 {"msg": "Liked Post"},
                 status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
             )
         else:
-            like.is_like = False
-            like.save()
+            self.toggle_like(like, is_like=False)
             return Response({"msg": "Unliked Post"}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=["get"])
+    def likers(self, request, pk=None):
+        """
+        Handles GET request to list the users who liked a post, newest first.
+
+        Returns:
+            Response: JSON response with ``next`` cursor and a page of likers.
+        """
+        likes = Like.objects.filter(post=pk, is_like=True).select_related("user")
+        paginator = KeysetCursorPagination()
+        page = paginator.paginate_queryset(likes, request, view=self)
+        liker_serializer = LikerSerializer(page, context={"request": request}, many=True)
+        return paginator.get_paginated_response(liker_serializer.data)
+
+    @staticmethod
+    def toggle_like(like, is_like):
+        """
+        Flips a like and adjusts the post's like_count in the same transaction.
+
+        The flip is a conditional update, so concurrent requests for the same like only
+        move the counter once.
+        """
+        with transaction.atomic():
+            flipped = Like.objects.filter(pk=like.pk, is_like=not is_like).update(
+                is_like=is_like, updated_at=timezone.now()
+            )
+            if flipped:
+                # Clamped, so an unlike on a drifted zero count cannot go negative.
+                delta = 1 if is_like else -1
+                Post.objects.filter(pk=like.post_id).update(
+                    like_count=Greatest(F("like_count") + delta, 0)
+                )
+
 
 class AddCommentView(viewsets.ViewSet):
     """
@@ -189,10 +223,27 @@ class AddCommentView(viewsets.ViewSet):
         }
         add_post_serializer = CommentSerializer(data=data)
         if add_post_serializer.is_valid():
-            add_post_serializer.save()
+            with transaction.atomic():
+                comment = add_post_serializer.save()
+                Post.objects.filter(pk=comment.post_id).update(
+                    comment_count=F("comment_count") + 1
+                )
             return Response({"msg": "Comment Created"}, status=status.HTTP_201_CREATED)
         return Response(add_post_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def retrieve(self, request, pk=None):
+        """
+        Handles GET request to list the comments of a post, newest first.
+
+        Returns:
+            Response: JSON response with ``next`` cursor and a page of comments.
+        """
+        comments = Comment.objects.filter(post=pk).select_related("user")
+        paginator = KeysetCursorPagination()
+        page = paginator.paginate_queryset(comments, request, view=self)
+        comment_serializer = CommentSerializer(page, many=True)
+        return paginator.get_paginated_response(comment_serializer.data)
+
 
 class FriendshipView(viewsets.ViewSet):
     """
@@ -269,6 +320,7 @@ class FriendshipView(viewsets.ViewSet):
                 | Q(from_user=request.user, to_user=pk, is_accepted=True)
                 | Q(to_user=request.user, from_user=pk, is_follow_back_accepted=True)
             ).first()
+            follows_before = timeline.follow_edges(friendrequest)
             if action == "accept":
                 if (
                     friendrequest.from_user == request.user
@@ -279,12 +331,14 @@ class FriendshipView(viewsets.ViewSet):
                 else:
                     friendrequest.is_accepted = True
                 friendrequest.save()
+                self.sync_timelines(follows_before, friendrequest)
                 return Response(
                     {"msg": "Request accepted"}, status=status.HTTP_201_CREATED
                 )
             elif action == "reject":
                 if friendrequest.to_user == request.user:
                     friendrequest.delete()
+                self.sync_timelines(follows_before, friendrequest)
                 return Response(
                     {"msg": "Request rejected"}, status=status.HTTP_201_CREATED
                 )
@@ -301,6 +355,7 @@ class FriendshipView(viewsets.ViewSet):
                     friendrequest.is_follow_back_accepted = False
                     friendrequest.is_follow_back_requested = False
                     friendrequest.save()
+                self.sync_timelines(follows_before, friendrequest)
                 return Response(
                     {"msg": "Unfollowed successfully"}, status=status.HTTP_200_OK
                 )
@@ -309,6 +364,16 @@ class FriendshipView(viewsets.ViewSet):
                 {"msg": "User does not exist"}, status=status.HTTP_404_NOT_FOUND
             )
 
+    @staticmethod
+    def sync_timelines(follows_before, friendrequest):
+        """
+        Backfill or prune feed timelines after a friendship row changed or was deleted.
+        """
+        follows_after = (
+            timeline.follow_edges(friendrequest) if friendrequest.pk else set()
+        )
+        timeline.sync_follow_edges(follows_before, follows_after)
+
     @action(detail=False, methods=["get"], url_path="list_requests")
     def list_requests(self, request):
         """
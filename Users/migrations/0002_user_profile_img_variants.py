@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_img_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -24,6 +24,7 @@ class User(AbstractUser):
 
     Attributes:
         profile_img (ImageField): Field for storing user's profile image.
+        profile_img_variants (JSONField): Resized copies of the profile image, see core.images.
         created_at (DateTimeField): Field for storing the timestamp when the user account was created.
         updated_at (DateTimeField): Field for storing the timestamp when the user account was last updated.
 
@@ -32,6 +33,7 @@ class User(AbstractUser):
     """
 
     profile_img = models.ImageField(upload_to=upload_to, blank=True, null=True)
+    profile_img_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True, editable=True)
 
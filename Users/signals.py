@@ -0,0 +1,74 @@
+"""
+Signal receivers keeping cached authentication, profile image variants and media
+blob references in sync with user changes.
+"""
+
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from core import images, storage
+from Posts.management.authentication import JWTAuthentication
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """
+    Drops cached token verifications when a user is changed or deleted.
+    """
+    JWTAuthentication.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def build_profile_image_variants(sender, instance, **kwargs):
+    """
+    Schedules resized copies of a new or replaced profile image.
+    """
+    if instance.profile_img and not images.is_current(
+        instance.profile_img, instance.profile_img_variants
+    ):
+        images.schedule([instance], "profile_img", "profile_img_variants")
+
+
+@receiver(post_init, sender=User)
+def remember_profile_image(sender, instance, **kwargs):
+    """
+    Notes the profile image a user was loaded with, so saving can tell whether it
+    changed. Left unset when the field was deferred.
+    """
+    if "profile_img" not in instance.__dict__:
+        instance._stored_profile_img = None
+        return
+    value = instance.__dict__["profile_img"]
+    instance._stored_profile_img = getattr(value, "name", value) or ""
+
+
+@receiver(post_save, sender=User)
+def reference_profile_image(sender, instance, created, **kwargs):
+    """
+    Moves the blob reference from the previous profile image to the new one.
+    """
+    previous = "" if created else getattr(instance, "_stored_profile_img", None)
+    current = instance.profile_img.name or ""
+    if previous is None or previous == current:
+        return
+    storage.acquire([current])
+    storage.release([previous])
+    instance._stored_profile_img = current
+
+
+@receiver(post_delete, sender=User)
+def release_profile_image(sender, instance, **kwargs):
+    if instance.profile_img:
+        storage.release([instance.profile_img.name])
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def invalidate_blacklisted_user_tokens(sender, instance, created, **kwargs):
+    """
+    Drops cached token verifications of a user whose refresh token was blacklisted.
+    """
+    if instance.token.user_id is not None:
+        JWTAuthentication.invalidate_user(instance.token.user_id)
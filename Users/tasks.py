@@ -0,0 +1,26 @@
+"""
+Background jobs for user accounts (see ``core.jobs``).
+"""
+
+from django.db.models import Q
+
+from Posts.models import Post
+from .models import User
+
+
+def delete_user(user_id):
+    """
+    Deletes a deactivated account with everything that cascades from it. Its media
+    files are released through their blob references, and the like and comment
+    counters of other users' posts it liked or commented on are recomputed.
+    """
+    if not User.objects.filter(pk=user_id, is_active=False).exists():
+        return
+    post_ids = list(
+        Post.objects.filter(Q(likes__user_id=user_id) | Q(comments__user_id=user_id))
+        .exclude(user_id=user_id)
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+    User.objects.filter(pk=user_id, is_active=False).delete()
+    Post.objects.filter(pk__in=post_ids).rebuild_counters()
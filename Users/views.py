@@ -8,16 +8,16 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import check_password
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
 import jwt
-import os
-import shutil
 
 from .serializers import RegisterSerializer, UserLoginSerializer, UserSerializer, UserSearchSerializer
 from .models import User
 
+from core import jobs
 from Posts.management.authentication import JWTAuthentication
 
 class RegisterView(viewsets.ViewSet):
@@ -37,7 +37,9 @@ class RegisterView(viewsets.ViewSet):
         """
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            # The profile image blob is locked until its reference is taken.
+            with transaction.atomic():
+                serializer.save()
             return Response({"msg": "User Created"}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -140,7 +142,8 @@ class UserProfileView(viewsets.ModelViewSet):
             return Response({"msg": "User permission denied"}, status=status.HTTP_403_FORBIDDEN)
         serializer = self.serializer_class(user, data=request.data, context={'request': request}, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
             return Response({"msg": "User Updated"}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -160,10 +163,12 @@ class UserProfileView(viewsets.ModelViewSet):
         if not check_password(password, user.password):
             return Response({"msg": "Password incorrect"}, status=status.HTTP_400_BAD_REQUEST)
         
-        if user.profile_img and os.path.isfile(user.profile_img.path):
-            shutil.rmtree(f'media/images/{user.username}')
-
-        user.delete()
+        # The account is locked out now and deleted with its posts, chats and media by
+        # a background job.
+        with transaction.atomic():
+            user.is_active = False
+            user.save(update_fields=["is_active"])
+            jobs.enqueue("Users.tasks.delete_user", user.pk, key=f"delete-user:{user.pk}")
         return Response({"msg": "User Deleted"}, status=status.HTTP_200_OK)
 
     def search(self, request):
@@ -197,6 +202,11 @@ class LogoutView(APIView):
             decode_refresh = jwt.decode(refresh_token, settings.SECRET_KEY, algorithms=['HS256'])
             token = RefreshToken(decode_refresh["refresh"])
             token.blacklist()
+            JWTAuthentication.invalidate_token(
+                JWTAuthentication.get_the_token_from_header(
+                    request.META.get("HTTP_AUTHORIZATION", "")
+                )
+            )
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
             return Response(status=status.HTTP_400_BAD_REQUEST)
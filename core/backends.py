@@ -0,0 +1,38 @@
+"""
+Loading of the pluggable backends named in settings, such as the unread counter store
+(``UNREAD_COUNTER_BACKEND``), the notification outbox (``NOTIFICATION_OUTBOX``) and
+the timeline backend (``TIMELINE_BACKEND``).
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+loaders = {}
+
+
+def backend_loader(setting_name):
+    """
+    Returns a function giving the instance of the class named by
+    ``settings.<setting_name>``. The instance is created on first use and shared by the
+    process until the setting changes, e.g. under ``override_settings``.
+
+    Returns:
+        function: The loader, with ``cache_clear()`` to drop the instance.
+    """
+
+    @lru_cache(maxsize=None)
+    def load():
+        return import_string(getattr(settings, setting_name))()
+
+    loaders[setting_name] = load
+    return load
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    if setting in loaders:
+        loaders[setting].cache_clear()
@@ -0,0 +1,126 @@
+"""
+Resized image variants of uploaded media.
+
+After an image is uploaded, a background job (see ``core.jobs``) writes a downsized, re-encoded copy
+for every width in ``settings.IMAGE_VARIANT_WIDTHS`` that is narrower than the
+original and records them on the row as::
+
+    {"source": "<original name>", "sizes": {"<width>": "<variant name>", ...}}
+
+Serializers then hand out the smallest variant at least as wide as the
+``image_size`` query parameter instead of the full-resolution original.
+"""
+
+import io
+from urllib.parse import urljoin
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from . import jobs
+from .storage import variant_name
+
+SIZE_QUERY_PARAM = "image_size"
+
+
+def build_variants(field_file):
+    """
+    Writes the variants of an image to its storage.
+
+    Returns:
+        dict: The variants record for ``field_file``.
+    """
+    with field_file.open("rb") as source, Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        sizes = {}
+        for width in sorted(settings.IMAGE_VARIANT_WIDTHS):
+            if width >= image.width:
+                break
+            resized = image.copy()
+            resized.thumbnail((width, image.height))
+            buffer = io.BytesIO()
+            resized.save(
+                buffer, settings.IMAGE_VARIANT_FORMAT, quality=settings.IMAGE_VARIANT_QUALITY
+            )
+            sizes[str(width)] = field_file.storage.save(
+                variant_name(field_file.name, width), ContentFile(buffer.getvalue())
+            )
+    return {"source": field_file.name, "sizes": sizes}
+
+
+def is_current(field_file, variants):
+    """
+    Returns:
+        bool: Whether ``variants`` were built from the file now in ``field_file``.
+    """
+    return bool(variants) and variants.get("source") == field_file.name
+
+
+def generate(model_label, pk, field_name, variants_field):
+    """
+    Builds and records the variants of one row's image. Rows deleted or given another
+    file in the meantime are left alone.
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).only(field_name).first()
+    field_file = getattr(instance, field_name, None)
+    if not field_file:
+        return
+    variants = build_variants(field_file)
+    model.objects.filter(pk=pk, **{field_name: field_file.name}).update(
+        **{variants_field: variants}
+    )
+
+
+def schedule(instances, field_name, variants_field):
+    """
+    Queues one job building the variants of the image in ``field_name`` of each of
+    ``instances``, at most once per row and file.
+    """
+    for instance in instances:
+        label = instance._meta.label
+        name = getattr(instance, field_name).name
+        jobs.enqueue(
+            "core.images.generate",
+            label,
+            instance.pk,
+            field_name,
+            variants_field,
+            key=f"image-variants:{label}:{instance.pk}:{name}",
+        )
+
+
+def requested_width(request):
+    """
+    Returns:
+        int or None: The width asked for with ``?image_size=``, if any.
+    """
+    if request is None:
+        return None
+    try:
+        return int(request.GET[SIZE_QUERY_PARAM])
+    except (KeyError, ValueError):
+        return None
+
+
+def image_url(field_file, variants, request):
+    """
+    Returns the absolute URL of the narrowest variant at least as wide as the requested
+    size, falling back to the original when none was requested or none is wide enough.
+
+    Returns:
+        str or None: The image URL if available, otherwise None.
+    """
+    if not field_file or request is None:
+        return None
+    url = field_file.url
+    width = requested_width(request)
+    if width is not None and is_current(field_file, variants):
+        wide_enough = [int(size) for size in variants["sizes"] if int(size) >= width]
+        if wide_enough:
+            url = field_file.storage.url(variants["sizes"][str(min(wide_enough))])
+    return urljoin(request.build_absolute_uri("/"), url)
@@ -0,0 +1,173 @@
+"""
+Database-backed background job queue.
+
+Request handlers ``enqueue`` slow side-effects (deleting accounts, building image
+variants, removing unreferenced media) as ``Job`` rows written in the same
+transaction as the change that needs them, so a job exists exactly when that change
+committed. ``manage.py run_jobs`` runs worker processes that claim due jobs, call the
+task named by its dotted path, and retry failures with exponential backoff.
+
+A job enqueued with a ``key`` is only ever created once for that key, which makes
+enqueueing idempotent.
+"""
+
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task, *args, key=None, delay=0, max_attempts=None, **kwargs):
+    """
+    Queues a call of the function at dotted path ``task`` with JSON-serializable
+    arguments. With a ``key``, an existing job of that key is returned instead.
+
+    Returns:
+        Job: The queued job.
+    """
+    fields = {
+        "task": task,
+        "args": list(args),
+        "kwargs": kwargs,
+        "run_at": timezone.now() + timedelta(seconds=delay),
+        "max_attempts": max_attempts or settings.JOB_MAX_ATTEMPTS,
+    }
+    if key is None:
+        return Job.objects.create(**fields)
+    job, _ = Job.objects.get_or_create(key=key, defaults=fields)
+    return job
+
+
+def worker_name():
+    """
+    Returns:
+        str: Identifier of this worker process, recorded on the jobs it claims.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def backoff(attempts):
+    """
+    Returns:
+        timedelta: Delay before retrying a job that failed ``attempts`` times.
+    """
+    seconds = settings.JOB_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.JOB_RETRY_MAX_DELAY))
+
+
+def requeue_stale():
+    """
+    Returns jobs whose worker died mid-run to the queue.
+
+    Returns:
+        int: Number of jobs requeued.
+    """
+    expired = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=expired).update(
+        status=Job.PENDING, locked_by=""
+    )
+
+
+def claim(worker, limit):
+    """
+    Marks up to ``limit`` due jobs as running for ``worker``. Jobs another worker
+    claims first are skipped.
+
+    Returns:
+        list: The claimed jobs.
+    """
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.PENDING, run_at__lte=now).order_by("run_at", "pk")
+
+    def take(pks):
+        Job.objects.filter(pk__in=pks, status=Job.PENDING).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F("attempts") + 1
+        )
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            due = due.select_for_update(skip_locked=True)
+            pks = list(due.values_list("pk", flat=True)[:limit])
+            take(pks)
+    else:
+        # Without row locks (SQLite) the update only takes jobs still pending, so each
+        # job goes to one worker; a read-then-write transaction would fail as locked.
+        pks = list(due.values_list("pk", flat=True)[:limit])
+        take(pks)
+    return list(
+        Job.objects.filter(pk__in=pks, status=Job.RUNNING, locked_by=worker, locked_at=now)
+        .order_by("run_at", "pk")
+    )
+
+
+def run(job, worker):
+    """
+    Runs a claimed job in a transaction and records the outcome. A failed job is
+    retried after ``backoff`` until it has been tried ``max_attempts`` times.
+
+    Returns:
+        bool: Whether the job succeeded.
+    """
+    try:
+        with transaction.atomic():
+            import_string(job.task)(*job.args, **job.kwargs)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s", job.pk, job.task, job.attempts)
+        if job.attempts >= job.max_attempts:
+            outcome = {"status": Job.FAILED}
+        else:
+            outcome = {"status": Job.PENDING, "run_at": timezone.now() + backoff(job.attempts)}
+        outcome["last_error"] = traceback.format_exc()
+        succeeded = False
+    else:
+        outcome = {"status": Job.DONE}
+        succeeded = True
+    Job.objects.filter(pk=job.pk, locked_by=worker).update(locked_by="", **outcome)
+    return succeeded
+
+
+def run_pending(worker=None, limit=None):
+    """
+    Runs every job that is due, one batch of ``JOB_BATCH_SIZE`` at a time.
+
+    Returns:
+        int: Number of jobs run.
+    """
+    worker = worker or worker_name()
+    requeue_stale()
+    count = 0
+    while limit is None or count < limit:
+        batch_size = settings.JOB_BATCH_SIZE
+        if limit is not None:
+            batch_size = min(batch_size, limit - count)
+        jobs = claim(worker, batch_size)
+        if not jobs:
+            break
+        for job in jobs:
+            run(job, worker)
+        count += len(jobs)
+    return count
+
+
+def purge():
+    """
+    Deletes finished jobs older than ``JOB_RETENTION``, after which their keys may be
+    enqueued again.
+
+    Returns:
+        int: Number of jobs deleted.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_RETENTION)
+    deleted, _ = Job.objects.filter(status=Job.DONE, updated_at__lt=cutoff).delete()
+    return deleted
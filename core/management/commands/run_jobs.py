@@ -0,0 +1,99 @@
+"""
+Management command running background job workers.
+"""
+
+import multiprocessing
+import signal
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connections
+
+# core.jobs is imported where it is used: a worker process started with the spawn start
+# method (the default on macOS and Windows) imports this module before Django is set up.
+
+
+def run_worker():
+    """
+    Entry point of a worker process. Sets Django up, which a spawned process has not
+    done yet, and polls for jobs until stopped.
+    """
+    django.setup()
+    Command().work()
+
+
+class Command(BaseCommand):
+    """
+    Runs worker processes that execute queued jobs (see ``core.jobs``) until
+    interrupted. SIGINT or SIGTERM lets every worker finish its current batch first.
+
+    Usage:
+        python manage.py run_jobs [--workers 1] [--once]
+    """
+
+    help = "Run background job workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes.")
+        parser.add_argument(
+            "--once", action="store_true", help="Run the jobs that are due, then exit."
+        )
+
+    def handle(self, *args, **options):
+        from core import jobs
+
+        if options["once"]:
+            count = jobs.run_pending()
+            self.stdout.write(self.style.SUCCESS(f"Ran {count} jobs."))
+            return
+        if options["workers"] == 1:
+            self.work()
+            return
+        # Children must open their own database connections.
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=run_worker, name=f"job-worker-{i}")
+            for i in range(options["workers"])
+        ]
+        for process in processes:
+            process.start()
+        signal.signal(signal.SIGTERM, lambda *_: [p.terminate() for p in processes])
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
+
+    def work(self):
+        """
+        Polls for due jobs every ``JOB_POLL_INTERVAL`` seconds while the queue is idle.
+        """
+        from core import jobs
+
+        stopping = False
+
+        def stop(*_):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        worker = jobs.worker_name()
+        self.stdout.write(f"Worker {worker} started.")
+        purged_at = 0
+        while not stopping:
+            close_old_connections()
+            try:
+                ran = jobs.run_pending(worker, limit=settings.JOB_BATCH_SIZE)
+            except DatabaseError as error:
+                self.stderr.write(f"Worker {worker}: {error}")
+                ran = 0
+            if not ran:
+                if time.monotonic() - purged_at > settings.JOB_PURGE_INTERVAL:
+                    jobs.purge()
+                    purged_at = time.monotonic()
+                time.sleep(settings.JOB_POLL_INTERVAL)
+        self.stdout.write(f"Worker {worker} stopped.")
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.6 on 2026-10-17 19:21
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_existing_references(apps, schema_editor):
+    PostImageVideo = apps.get_model('Posts', 'PostImageVideo')
+    User = apps.get_model('Users', 'User')
+    Blob = apps.get_model('core', 'Blob')
+    references = Counter(PostImageVideo.objects.exclude(file='').values_list('file', flat=True))
+    references.update(User.objects.exclude(profile_img='').values_list('profile_img', flat=True))
+    Blob.objects.bulk_create(
+        [Blob(name=name, references=count) for name, count in references.items() if name]
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('Posts', '0010_postimagevideo_variants'),
+        ('Users', '0002_user_profile_img_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('references', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_existing_references, migrations.RunPython.noop),
+    ]
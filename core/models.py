@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class BaseModel(models.Model):
     """
@@ -13,4 +14,54 @@ class BaseModel(models.Model):
         abstract = True
 
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True, editable=True)
\ No newline at end of file
+    updated_at = models.DateTimeField(auto_now=True, editable=True)
+
+
+class Blob(models.Model):
+    """
+    A stored media file and the number of model fields referencing it (see
+    ``core.storage``).
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+
+
+class Job(BaseModel):
+    """
+    A unit of background work run by ``manage.py run_jobs`` (see ``core.jobs``).
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="job_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
@@ -0,0 +1,135 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Pages are addressed by the ``(created_at, id)`` pair of the last row that was
+returned instead of an offset, so fetching a page costs the same no matter how
+deep the client has scrolled.
+"""
+
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+def encode_cursor(position, pk):
+    """
+    Encodes a keyset position into an opaque, url-safe cursor string.
+
+    Args:
+        position (datetime): Value of the ordering field of the last row.
+        pk (int): Primary key of the last row.
+
+    Returns:
+        str: The opaque cursor.
+    """
+    raw = json.dumps([position.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor produced by ``encode_cursor``.
+
+    Returns:
+        tuple: ``(datetime, int)`` keyset position.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        position = parse_datetime(position)
+        pk = int(pk)
+    except (TypeError, ValueError, binascii.Error):
+        raise ValueError("Invalid cursor")
+    if position is None:
+        raise ValueError("Invalid cursor")
+    return position, pk
+
+
+def keyset_page(
+    queryset, cursor=None, page_size=None, field="created_at", tiebreaker="id"
+):
+    """
+    Returns one page of ``queryset`` ordered newest first by ``(field, tiebreaker)``.
+
+    Args:
+        queryset (QuerySet): The rows to paginate.
+        cursor (str): Cursor returned with the previous page, or None for the first page.
+        page_size (int): Number of rows in the page, or None for every remaining row.
+        field (str): Name of the datetime field (or annotation) to order by.
+        tiebreaker (str): Name of the unique integer field breaking ties on ``field``.
+
+    Returns:
+        tuple: ``(rows, next_cursor)`` where ``next_cursor`` is None on the last page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    queryset = queryset.order_by(f"-{field}", f"-{tiebreaker}")
+    if cursor:
+        position, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f"{field}__lt": position})
+            | Q(**{field: position, f"{tiebreaker}__lt": pk})
+        )
+    if page_size is None:
+        return list(queryset), None
+    rows = list(queryset[: page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, field), getattr(last, tiebreaker))
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    DRF pagination class returning ``{"next": <cursor>, "results": [...]}``.
+
+    The page size defaults to ``settings.PAGE_SIZE`` and can be lowered or raised
+    by the client through ``?page_size=`` up to ``settings.MAX_PAGE_SIZE``.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    field = "created_at"
+
+    def __init__(self, field=None):
+        if field:
+            self.field = field
+        self.next_cursor = None
+
+    def get_page_size(self, request):
+        """
+        Method to get the page size requested by the client.
+
+        Returns:
+            int: The page size, clamped to ``settings.MAX_PAGE_SIZE``.
+        """
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.PAGE_SIZE
+        return max(1, min(page_size, settings.MAX_PAGE_SIZE))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor = request.query_params.get(self.cursor_query_param)
+        try:
+            rows, self.next_cursor = keyset_page(
+                queryset, cursor, self.get_page_size(request), self.field
+            )
+        except ValueError:
+            raise NotFound("Invalid cursor")
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.next_cursor, "results": data})
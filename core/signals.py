@@ -0,0 +1,22 @@
+"""
+Signal receivers shared by every app.
+"""
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    With ``DB_SQLITE_WAL`` on, turns on write-ahead logging for SQLite connections so
+    readers no longer block the writer and concurrent requests stop failing with
+    "database is locked". WAL persists in the database file, so it stays off unless
+    asked for.
+    """
+    if connection.vendor != "sqlite" or not settings.DB_SQLITE_WAL:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
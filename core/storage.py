@@ -0,0 +1,157 @@
+"""
+Content-addressed, deduplicated media storage.
+
+``ContentAddressedStorage`` names every uploaded file after the SHA-256 of its bytes,
+so identical uploads share one immutable blob under ``blobs/``. Each ``Blob`` row
+counts the model fields currently pointing at a blob; ``acquire`` and ``release`` are
+called as references come and go, and a blob is deleted along with its resized
+variants by a background job queued with the change dropping its last reference.
+
+Uploads and ``collect`` both lock the blob's row before touching its file. An upload
+holds the lock until its transaction ends, so it must take its reference in the same
+transaction; ``collect`` then either runs first, and the upload writes the file again,
+or finds the reference and leaves the file alone.
+"""
+
+import hashlib
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import F
+
+from . import jobs
+from .models import Blob
+
+BLOB_DIRECTORY = "blobs"
+
+
+def is_blob(name):
+    """
+    Returns:
+        bool: Whether ``name`` lies in the content-addressed blob tree.
+    """
+    return name.startswith(f"{BLOB_DIRECTORY}/")
+
+
+def variant_name(name, width):
+    """
+    Returns the storage name of the ``width`` variant of the file ``name``. Variants
+    always lie in the blob tree, so storage keeps their names and ``collect`` finds
+    them again; those of files stored before content addressing are placed by a hash
+    of the original's name.
+
+    Returns:
+        str: Storage name of the variant.
+    """
+    directory, filename = os.path.split(name)
+    root = os.path.splitext(filename)[0]
+    if not is_blob(name):
+        root = hashlib.sha256(name.encode()).hexdigest()
+        directory = f"{BLOB_DIRECTORY}/{root[:2]}/{root[2:4]}"
+    extension = settings.IMAGE_VARIANT_FORMAT.lower()
+    return os.path.join(directory, "variants", f"{root}_{width}.{extension}")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that saves uploads as ``blobs/ab/cd/<sha256><ext>``. The hash
+    is computed while streaming the upload, and content already stored is not written
+    again. Files named inside the blob tree already (such as the variants of a blob)
+    keep their names.
+
+    Call ``save`` in the transaction that references the blob (see ``lock``).
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        if not is_blob(name):
+            digest = hashlib.sha256()
+            for chunk in content.chunks():
+                digest.update(chunk)
+            content.seek(0)
+            hexdigest = digest.hexdigest()
+            extension = os.path.splitext(name)[1].lower()
+            name = f"{BLOB_DIRECTORY}/{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}{extension}"
+            lock([name])
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+def lock(names):
+    """
+    Locks the ``Blob`` rows of ``names``, creating missing ones with no references,
+    until the current transaction ends. A concurrent ``collect`` of the same blobs
+    waits for the lock and sees the references taken meanwhile.
+    """
+    names = sorted(set(names))
+    if not names:
+        return
+    Blob.objects.bulk_create([Blob(name=name) for name in names], ignore_conflicts=True)
+    Blob.objects.filter(name__in=names).update(references=F("references"))
+
+
+def acquire(names):
+    """
+    Adds one reference to the blob of every name in ``names``.
+    """
+    counts = Counter(name for name in names if name)
+    if not counts:
+        return
+    Blob.objects.bulk_create(
+        [Blob(name=name) for name in counts], ignore_conflicts=True
+    )
+    by_count = {}
+    for name, count in counts.items():
+        by_count.setdefault(count, []).append(name)
+    for count, batch in by_count.items():
+        Blob.objects.filter(name__in=batch).update(references=F("references") + count)
+
+
+def release(names):
+    """
+    Drops one reference to the blob of every name in ``names`` and queues a job
+    collecting the blobs left unreferenced.
+    """
+    counts = Counter(name for name in names if name)
+    for name, count in counts.items():
+        Blob.objects.filter(name=name, references__gte=count).update(
+            references=F("references") - count
+        )
+    unreferenced = Blob.objects.filter(name__in=counts, references=0).values_list(
+        "name", flat=True
+    )
+    if counts and unreferenced:
+        jobs.enqueue("core.storage.collect", sorted(unreferenced))
+
+
+def collect(names):
+    """
+    Deletes the files, and their variants, of every name in ``names`` that no row
+    references, e.g. blobs whose last reference was released or uploads whose
+    transaction rolled back. The rows are locked and deleted first, and only the files
+    of deleted rows are removed.
+
+    Returns:
+        int: Number of files deleted.
+    """
+    with transaction.atomic():
+        lock(names)
+        unreferenced = list(
+            Blob.objects.select_for_update()
+            .filter(name__in=set(names), references=0)
+            .values_list("name", flat=True)
+        )
+        Blob.objects.filter(name__in=unreferenced).delete()
+        for name in unreferenced:
+            default_storage.delete(name)
+            for width in settings.IMAGE_VARIANT_WIDTHS:
+                default_storage.delete(variant_name(name, width))
+    return len(unreferenced)
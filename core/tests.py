@@ -0,0 +1,181 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from PIL import Image
+
+from Posts.models import Comment, Like, Post
+from Users.models import User
+from . import images, jobs
+from .models import Blob, Job
+
+
+class MediaServingTest(SimpleTestCase):
+    """
+    Tests for range and conditional requests on the media view.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.digest = "ab" * 32
+        self.path = f"blobs/ab/ab/{self.digest}.mp4"
+        os.makedirs(os.path.join(self.media_root, "blobs/ab/ab"))
+        with open(os.path.join(self.media_root, self.path), "wb") as file:
+            file.write(bytes(range(100)))
+
+    def get(self, path=None, **headers):
+        return self.client.get(f"/media/{path or self.path}", headers=headers)
+
+    def test_blob_is_immutable_and_revalidates_with_etag(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), bytes(range(100)))
+        self.assertEqual(response["ETag"], f'"{self.digest}"')
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(self.get(**{"If-None-Match": response["ETag"]}).status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.get(Range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(b"".join(response.streaming_content), bytes(range(10, 20)))
+
+        suffix = self.get(Range="bytes=-5")
+        self.assertEqual(b"".join(suffix.streaming_content), bytes(range(95, 100)))
+        self.assertEqual(self.get(Range="bytes=100-").status_code, 416)
+        self.assertEqual(self.get(Range="bytes=0-9", **{"If-Range": '"stale"'}).status_code, 200)
+
+    def test_range_on_empty_file_is_unsatisfiable(self):
+        open(os.path.join(self.media_root, "empty.mp4"), "wb").close()
+        response = self.get("empty.mp4", Range="bytes=-5")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */0")
+
+    @override_settings(MEDIA_OFFLOAD="x-accel-redirect")
+    def test_offload_hands_file_to_proxy(self):
+        response = self.get()
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.path}")
+        self.assertEqual(response.content, b"")
+
+        os.makedirs(os.path.join(self.media_root, "images/ana"))
+        open(os.path.join(self.media_root, "images/ana/my café.jpg"), "wb").close()
+        response = self.get("images/ana/my café.jpg")
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/images/ana/my%20caf%C3%A9.jpg"
+        )
+
+    def test_paths_outside_media_root_are_not_found(self):
+        self.assertEqual(self.get("../../etc/passwd").status_code, 404)
+        self.assertEqual(self.get("blobs/missing.mp4").status_code, 404)
+
+
+def flaky(attempts_before_success):
+    """
+    Job task failing until it was called ``attempts_before_success`` times.
+    """
+    flaky.calls += 1
+    if flaky.calls <= attempts_before_success:
+        raise RuntimeError("not yet")
+
+
+class JobQueueTest(TestCase):
+    """
+    Tests for the background job queue.
+    """
+
+    def setUp(self):
+        flaky.calls = 0
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = jobs.enqueue("core.tests.flaky", 1)
+        with self.assertLogs("core.jobs", "ERROR"):
+            self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertEqual(jobs.run_pending(), 0)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 2))
+
+    def test_job_fails_after_max_attempts(self):
+        job = jobs.enqueue("core.tests.flaky", 5, max_attempts=1)
+        with self.assertLogs("core.jobs", "ERROR"):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn("not yet", job.last_error)
+
+    def test_same_key_is_enqueued_once(self):
+        first = jobs.enqueue("core.tests.flaky", 0, key="once")
+        self.assertEqual(jobs.enqueue("core.tests.flaky", 0, key="once"), first)
+        jobs.run_pending()
+        jobs.enqueue("core.tests.flaky", 0, key="once")
+        self.assertEqual(jobs.run_pending(), 0)
+        self.assertEqual(flaky.calls, 1)
+
+    def test_account_deletion_runs_off_the_request(self):
+        user = User.objects.create(username="leaving")
+        user.set_password("secret")
+        user.save()
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.delete(f"/userprofile/{user.pk}/", {"password": "secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(User.objects.get(pk=user.pk).is_active)
+        jobs.run_pending()
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+
+    def test_account_deletion_recounts_other_posts(self):
+        author = User.objects.create(username="author")
+        post = Post.objects.create(user=author, content="post", like_count=1, comment_count=1)
+        user = User.objects.create(username="leaving", is_active=False)
+        Like.objects.create(user=user, post=post, is_like=True)
+        Comment.objects.create(user=user, post=post, content="bye")
+        jobs.enqueue("Users.tasks.delete_user", user.pk)
+        jobs.run_pending()
+        post.refresh_from_db()
+        self.assertEqual((post.like_count, post.comment_count), (0, 0))
+
+
+class BlobCollectionTest(TestCase):
+    """
+    Tests for collecting unreferenced media and their variants.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.media_root) for name in names]
+
+    def test_variants_of_legacy_original_are_collected(self):
+        os.makedirs(os.path.join(self.media_root, "images/ana"))
+        Image.new("RGB", (800, 600), "red").save(
+            os.path.join(self.media_root, "images/ana/p.png")
+        )
+        user = User.objects.create(username="ana", profile_img="images/ana/p.png")
+        jobs.run_pending()
+        images.generate("Users.User", user.pk, "profile_img", "profile_img_variants")
+        user.refresh_from_db()
+        self.assertEqual(len(user.profile_img_variants["sizes"]), 3)
+        self.assertEqual(len(self.stored_files()), 4)
+
+        user.delete()
+        jobs.run_pending()
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(Blob.objects.exists())
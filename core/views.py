@@ -0,0 +1,150 @@
+"""
+Production serving of uploaded media under ``MEDIA_URL``.
+
+Supports single byte ranges so videos can be scrubbed without downloading them again,
+strong ``ETag`` validators with ``If-None-Match`` and ``If-Range``, and long-lived
+``immutable`` caching for content-addressed blobs. With ``MEDIA_OFFLOAD`` set, the
+view only checks the request and hands the file to the fronting proxy through
+``X-Accel-Redirect`` (nginx) or ``X-Sendfile`` (Apache, lighttpd).
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+
+from .storage import is_blob
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def media_etag(path, stat):
+    """
+    Returns:
+        str: A strong ETag, the content hash for blobs, otherwise size and mtime.
+    """
+    if is_blob(path):
+        return f'"{os.path.splitext(os.path.basename(path))[0]}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """
+    Parses a single-range ``Range`` header.
+
+    Returns:
+        tuple or None: Inclusive ``(start, end)`` byte offsets, or None when the header
+        should be ignored and the whole file sent.
+
+    Raises:
+        ValueError: If the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if size == 0:
+        raise ValueError(header)
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Handles GET and HEAD requests for a file under ``MEDIA_ROOT``.
+
+    Returns:
+        HttpResponse: The file, a 206 partial response, a 304 when the client's copy is
+        current, or a 416 for an unsatisfiable range.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Media not found")
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("Media not found")
+    if not os.path.isfile(full_path):
+        raise Http404("Media not found")
+
+    etag = media_etag(path, stat)
+    if is_blob(path):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in parse_etags(if_none_match)):
+        return HttpResponseNotModified(headers=headers)
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or "application/octet-stream"
+
+    if settings.MEDIA_OFFLOAD:
+        # The proxy serves the body and answers Range requests itself.
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if settings.MEDIA_OFFLOAD == "x-accel-redirect":
+            # Legacy names may hold spaces or non-ASCII characters.
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+        else:
+            response["X-Sendfile"] = full_path
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return HttpResponse(status=416, headers=headers)
+
+    start, end = byte_range or (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    body = () if request.method == "HEAD" else read_range(full_path, start, end)
+    return StreamingHttpResponse(
+        body,
+        status=206 if byte_range else 200,
+        content_type=content_type,
+        headers=headers,
+    )